@@ -0,0 +1,218 @@
+""" Policies for picking the execution engine a script runs with. """
+
+
+from pigthon.history import script_identity
+from pigthon.util.ptlog import PtLog
+import copy
+import time
+
+
+logger = PtLog(__name__)
+
+
+def script_key(options):
+    """
+    Identifies the script an options object runs.
+
+    :param options: the options to identify the script of
+    :type options: PigOptions
+    :returns: the script's file, or the statements executed
+    :rtype: str or None
+    """
+    if options.file() is not None:
+        return options.file()
+    return options.execute()
+
+
+class EnginePolicy(object):
+    """
+    Base class for choosing an exectype for scripts that do not set one.
+    """
+
+    def __init__(self, default='mapreduce'):
+        """
+        :param str default: the exectype used when there is nothing to base
+         a decision on
+        """
+        self.default = default
+
+    def select(self, pigthon, options):
+        """
+        Chooses the exectype to run the script with.
+
+        :param Pigthon pigthon: the instance that will run the script
+        :param PigOptions options: the options the script will be run with
+        :rtype: str
+        """
+        return self.default
+
+    def record(self, options, seconds, succeeded=True):
+        """
+        Records how long a script took to run.
+
+        :param PigOptions options: the options the script was run with
+        :param float seconds: the wall clock time the run took
+        :param bool succeeded: whether pig exited successfully
+        """
+        pass
+
+
+class HistoryEnginePolicy(EnginePolicy):
+    """
+    Picks the engine that has been fastest for a script so far, trying each
+    candidate once before relying on the measurements. An engine whose last
+    run of a script failed is passed over for that script until retry_after
+    seconds have passed.
+
+    Measurements are kept in memory unless a RunHistory is supplied, in
+    which case they are read from the runs it has recorded, so that
+    processes that each run a script once still choose between engines.
+    The same history must be passed to Pigthon for the runs to be recorded.
+    """
+
+    def __init__(self, candidates=('mapreduce', 'tez'), window=5,
+                 retry_after=3600, history=None, **kwargs):
+        """
+        :param tuple candidates: the exectypes to choose between, in order of
+         preference
+        :param int window: the number of recent runs per engine to average
+        :param float retry_after: the seconds after a failure before the
+         engine is tried again
+        :param history: the recorded runs to base decisions on
+        :type history: pigthon.history.RunHistory or None
+        """
+        kwargs.setdefault('default', candidates[0])
+        super(HistoryEnginePolicy, self).__init__(**kwargs)
+        self.candidates = candidates
+        self.window = window
+        self.retry_after = retry_after
+        self.history = history
+        self._durations = dict()
+        self._failed = dict()
+
+    def durations(self, key, exectype):
+        """
+        The most recent durations measured for a script on an engine.
+
+        :param str key: the script, see script_key
+        :param str exectype: the engine
+        :rtype: list
+        """
+        return self._durations.get((key, exectype), [])
+
+    def measurements(self, options):
+        """
+        The recent durations of a script on each engine, and when its last
+        run on each engine failed, if it did.
+
+        :param PigOptions options: the options the script will be run with
+        :returns: lists of durations and failure times, keyed by exectype
+        :rtype: tuple(dict, dict)
+        """
+        if self.history is None:
+            key = script_key(options)
+            return (
+                dict((e, self.durations(key, e)) for e in self.candidates),
+                dict(
+                    (e, self._failed[(key, e)]) for e in self.candidates
+                    if (key, e) in self._failed
+                )
+            )
+
+        durations = dict((e, []) for e in self.candidates)
+        failed = dict()
+        runs = self.history.runs(script_hash=script_identity(options)[0])
+        for run in runs:
+            exectype = _run_exectype(run['options'])
+            if exectype not in durations:
+                continue
+            seen = len(durations[exectype]) > 0 or exectype in failed
+            if run['exit_code'] != 0:
+                if not seen:
+                    failed[exectype] = run['started'] + run['duration']
+                continue
+            if len(durations[exectype]) < self.window:
+                durations[exectype].append(run['duration'])
+        for exectype in durations:
+            durations[exectype].reverse()
+        return durations, failed
+
+    def select(self, pigthon, options):
+        durations, failed = self.measurements(options)
+        now = time.time()
+        best, best_mean = None, None
+        for exectype in self.candidates:
+            if exectype in failed and now - failed[exectype] < \
+                    self.retry_after:
+                continue
+            if len(durations[exectype]) == 0:
+                return exectype
+            mean = sum(durations[exectype]) / \
+                float(len(durations[exectype]))
+            if best_mean is None or mean < best_mean:
+                best, best_mean = exectype, mean
+        return best if best is not None else self.default
+
+    def record(self, options, seconds, succeeded=True):
+        if self.history is not None:
+            # Pigthon records the run in the history itself
+            return
+        key = (script_key(options), options.exectype() or 'mapreduce')
+        if not succeeded:
+            logger.info('{} failed with {}, not selecting it for {} '
+                        'seconds'.format(key[0], key[1], self.retry_after))
+            self._failed[key] = time.time()
+            return
+        self._failed.pop(key, None)
+        durations = self._durations.setdefault(key, [])
+        durations.append(seconds)
+        del durations[:-self.window]
+
+
+class PlanEnginePolicy(EnginePolicy):
+    """
+    Explains the script and picks a DAG engine when it compiles to a chain of
+    MapReduce jobs, where avoiding the intermediate writes pays off.
+    """
+
+    def __init__(self, dag_engine='tez', min_jobs=2, explain_exectype='local',
+                 **kwargs):
+        """
+        :param str dag_engine: the exectype used for multi-job scripts
+        :param int min_jobs: the job count at which the DAG engine is used
+        :param str explain_exectype: the exectype used to explain the script;
+         local avoids contacting the cluster
+        """
+        super(PlanEnginePolicy, self).__init__(**kwargs)
+        self.dag_engine = dag_engine
+        self.min_jobs = min_jobs
+        self.explain_exectype = explain_exectype
+        self._selected = dict()
+
+    def select(self, pigthon, options):
+        key = script_key(options)
+        if options.file() is None:
+            return self.default
+        if key in self._selected:
+            return self._selected[key]
+
+        explain_options = copy.deepcopy(options)
+        explain_options._options['exectype'] = self.explain_exectype
+        code, plan, error = pigthon.explain(explain_options)
+        if code != 0:
+            logger.info('Unable to explain {}, using {}'.format(
+                key, self.default))
+            return self.default
+
+        exectype = self.default
+        if plan.job_count() >= self.min_jobs:
+            exectype = self.dag_engine
+        self._selected[key] = exectype
+        return exectype
+
+
+def _run_exectype(options):
+    """ The exectype a run recorded in a RunHistory used. """
+    if '-exectype' in options:
+        return options[options.index('-exectype') + 1]
+    return 'mapreduce'
@@ -0,0 +1,238 @@
+""" Parses the output of pig's EXPLAIN into an inspectable plan. """
+
+
+import re
+
+
+# the titles pig prints between '#----' rules at the top of each plan
+_SECTIONS = {
+    'New Logical Plan:': 'logical',
+    'Logical Plan:': 'logical',
+    'Physical Plan:': 'physical',
+    'Map Reduce Plan': 'mapreduce',
+}
+
+_JOB_START = re.compile(r'^MapReduce node (?P<scope>\S+)')
+_JOB_PLANS = {
+    'Map Plan': 'map',
+    'Combine Plan': 'combine',
+    'Reduce Plan': 'reduce',
+}
+_GLOBAL_SORT = re.compile(r'^Global sort: (?P<value>true|false)')
+_LOGICAL_JOIN = re.compile(
+    r'(?P<alias>[\w:]+): \(Name: LOJoin\((?P<type>\w+)\)'
+)
+_USER_FUNC = re.compile(r'POUserFunc\((?P<func>[\w.$]+)\)')
+_ALGEBRAIC = re.compile(
+    r'^(COUNT|COUNT_STAR|SUM|AVG|MIN|MAX|'
+    r'(Int|Long|Float|Double|BigDecimal|BigInteger|String)(Sum|Avg|Min|Max))$'
+)
+
+
+class MapReduceJob(object):
+    """ A single MapReduce node from the plan. """
+
+    def __init__(self, scope):
+        """
+        :param str scope: the scope pig assigned to the node, e.g. scope-14
+        """
+        self.scope = scope
+        self.plans = {'map': [], 'combine': [], 'reduce': []}
+        self.global_sort = False
+
+    def map_plan(self):
+        """ Lines making up the map plan. """
+        return self.plans['map']
+
+    def combine_plan(self):
+        """ Lines making up the combine plan. """
+        return self.plans['combine']
+
+    def reduce_plan(self):
+        """ Lines making up the reduce plan. """
+        return self.plans['reduce']
+
+    def is_map_only(self):
+        """ True if the job never shuffles its output to reducers. """
+        return len(self.reduce_plan()) == 0
+
+    def uses_combiner(self):
+        """ True if pig was able to push work into a combiner. """
+        return len(self.combine_plan()) > 0
+
+    def algebraic_funcs(self):
+        """
+        Algebraic builtins evaluated in full on the reduce side, i.e. those
+        that were not split into Initial/Intermed/Final stages.
+
+        :rtype: list
+        """
+        funcs = []
+        for line in self.reduce_plan():
+            for match in _USER_FUNC.finditer(line):
+                func = match.group('func')
+                if '$' in func:
+                    continue
+                if _ALGEBRAIC.match(func.rsplit('.', 1)[-1]):
+                    funcs.append(func)
+        return funcs
+
+
+class ExplainPlan(object):
+    """ The logical, physical and MapReduce plans pig built for a script. """
+
+    def __init__(self, logical=None, physical=None, jobs=None, options=None):
+        """
+        :param list logical: lines of the logical plan
+        :param list physical: lines of the physical plan
+        :param list jobs: the MapReduceJobs in the plan
+        :param options: the options the script was explained with
+        :type options: PigOptions or None
+        """
+        self.logical = logical if logical is not None else []
+        self.physical = physical if physical is not None else []
+        self.jobs = jobs if jobs is not None else []
+        self.options = options
+
+    @classmethod
+    def parse(cls, lines, options=None):
+        """
+        Builds a plan from the text output of pig's EXPLAIN.
+
+        :param list lines: the output lines from pig
+        :param options: the options the script was explained with
+        :type options: PigOptions or None
+        :rtype: ExplainPlan
+        """
+        plan = cls(options=options)
+        section = None
+        job = None
+        job_plan = None
+        for line in _split_separators(lines):
+            stripped = line.strip()
+            if stripped.startswith('#'):
+                title = stripped.lstrip('#').strip()
+                if title in _SECTIONS:
+                    section = _SECTIONS[title]
+                    job = None
+                    job_plan = None
+                continue
+
+            if section == 'logical':
+                if stripped:
+                    plan.logical.append(line)
+            elif section == 'physical':
+                if stripped:
+                    plan.physical.append(line)
+            elif section == 'mapreduce':
+                match = _JOB_START.match(stripped)
+                if match is not None:
+                    job = MapReduceJob(match.group('scope'))
+                    plan.jobs.append(job)
+                    job_plan = None
+                    continue
+                if job is None:
+                    continue
+                if stripped in _JOB_PLANS:
+                    job_plan = _JOB_PLANS[stripped]
+                    continue
+                match = _GLOBAL_SORT.match(stripped)
+                if match is not None:
+                    job.global_sort = match.group('value') == 'true'
+                    job_plan = None
+                    continue
+                if stripped.startswith('--------'):
+                    job_plan = None
+                    continue
+                if job_plan is not None and stripped:
+                    job.plans[job_plan].append(line)
+        return plan
+
+    def job_count(self):
+        """ The number of MapReduce jobs the script compiles to. """
+        return len(self.jobs)
+
+    def shuffle_count(self):
+        """ The number of jobs that shuffle data to a reduce phase. """
+        return len([j for j in self.jobs if not j.is_map_only()])
+
+    def joins(self):
+        """
+        The joins in the logical plan.
+
+        :returns: (alias, join type) pairs, e.g. ('C', 'HASH')
+        :rtype: list
+        """
+        joins = []
+        for line in self.logical:
+            match = _LOGICAL_JOIN.search(line)
+            if match is not None:
+                joins.append((match.group('alias'), match.group('type')))
+        return joins
+
+    def replicated_join_candidates(self):
+        """
+        Aliases of hash joins, each of which costs a shuffle. These can be
+        rewritten using 'replicated' when all but one input fits in memory.
+        """
+        return [alias for alias, kind in self.joins() if kind == 'HASH']
+
+    def missing_combiners(self):
+        """
+        Scopes of jobs that evaluate algebraic functions on the reduce side
+        without a combiner, usually because the FOREACH mixes them with
+        non-algebraic expressions.
+        """
+        return [
+            job.scope for job in self.jobs
+            if not job.uses_combiner() and len(job.algebraic_funcs()) > 0
+        ]
+
+    def warnings(self):
+        """ Human readable descriptions of the anti-patterns found. """
+        warnings = []
+        if self.options is not None and self.options.no_multiquery():
+            warnings.append(
+                'no_multiquery is set; scripts with several STOREs will not '
+                'share jobs'
+            )
+        for alias in self.replicated_join_candidates():
+            warnings.append(
+                'join {} shuffles all inputs; consider USING \'replicated\' '
+                'if the smaller inputs fit in memory'.format(alias)
+            )
+        for scope in self.missing_combiners():
+            warnings.append(
+                'job {} aggregates without a combiner'.format(scope)
+            )
+        return warnings
+
+    def report(self):
+        """
+        Summarizes the plan's cost, suitable for comparing between runs.
+
+        :rtype: dict
+        """
+        return {
+            'jobs': self.job_count(),
+            'shuffles': self.shuffle_count(),
+            'replicated_join_candidates': self.replicated_join_candidates(),
+            'missing_combiners': self.missing_combiners(),
+            'warnings': self.warnings(),
+        }
+
+
+def _split_separators(lines):
+    """
+    Pig prints the '--------' that ends a map, combine or reduce plan without
+    a preceding newline, so pull it onto a line of its own.
+    """
+    for line in lines:
+        stripped = line.rstrip()
+        if stripped.endswith('--------') and \
+                not stripped.lstrip().startswith('#') and \
+                stripped.strip('-').strip():
+            yield stripped.rstrip('-')
+            yield '--------'
+        else:
+            yield line
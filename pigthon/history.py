@@ -0,0 +1,462 @@
+"""
+Records every pig run in a local SQLite database and flags scripts whose
+runs deviate from their recent history.
+
+Usage: python -m pigthon.history DATABASE [--window N] [--threshold Z]
+                                         [--min-runs N] [--param NAME]
+"""
+
+
+from pigthon.util.ptlog import PtLog
+from threading import Thread
+import argparse
+import atexit
+import hashlib
+import json
+import math
+import re
+import sqlite3
+import sys
+import time
+
+try:
+    from Queue import Queue, Empty
+except ImportError:
+    # Python 3.x
+    # noinspection PyUnresolvedReferences
+    from queue import Queue, Empty
+
+
+logger = PtLog(__name__)
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    script_hash TEXT NOT NULL,
+    script TEXT,
+    options TEXT NOT NULL,
+    exit_code INTEGER NOT NULL,
+    started REAL NOT NULL,
+    duration REAL NOT NULL,
+    counters TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_script ON runs (script_hash, started);
+"""
+
+_INSERT = """
+INSERT INTO runs (script_hash, script, options, exit_code, started, duration,
+                  counters)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+
+_COUNTERS = [
+    ('records_read', re.compile(
+        r'Successfully read (\d+) records(?: \((\d+) bytes\))? from')),
+    ('records_written', re.compile(
+        r'Successfully stored (\d+) records(?: \((\d+) bytes\))? in')),
+]
+_TOTALS = {
+    'records_written': re.compile(r'Total records written : (\d+)'),
+    'bytes_written': re.compile(r'Total bytes written : (\d+)'),
+    'spill_count': re.compile(r'Spillable Memory Manager spill count : (\d+)'),
+}
+_JOB_ID = re.compile(r'\b(job_(?:local)?\d+_\d+)\b')
+
+# the metrics regressions are detected for
+METRICS = ['duration', 'records_written', 'bytes_written']
+
+# stand-ins that tell the writer thread to write what it has
+_FLUSH = object()
+_STOP = object()
+
+
+def parse_counters(lines):
+    """
+    Pulls the job counters out of the statistics pig logs when a script
+    finishes.
+
+    :param list lines: pig's output and error lines
+    :rtype: dict
+    """
+    counters = dict()
+    for line in lines:
+        for name, pattern in _COUNTERS:
+            match = pattern.search(line)
+            if match is not None:
+                counters[name] = counters.get(name, 0) + int(match.group(1))
+                if match.group(2) is not None:
+                    key = name.replace('records', 'bytes')
+                    counters[key] = counters.get(key, 0) + \
+                        int(match.group(2))
+    jobs = set()
+    for line in lines:
+        # the totals are authoritative over sums of the per-output lines
+        for name, pattern in _TOTALS.iteritems():
+            match = pattern.search(line)
+            if match is not None:
+                counters[name] = int(match.group(1))
+        jobs.update(_JOB_ID.findall(line))
+    if len(jobs) > 0:
+        counters['jobs'] = len(jobs)
+    return counters
+
+
+def script_identity(options):
+    """
+    Identifies the script an options object runs by its content, so that
+    edits to a script start a new history.
+
+    :param options: the options the script ran with
+    :type options: PigOptions
+    :returns: the hash of the script's content and its file or statements
+    :rtype: tuple(str, str)
+    """
+    if options.file() is not None:
+        try:
+            with open(options.file(), 'rb') as f:
+                content = f.read()
+        except IOError:
+            content = options.file()
+        return hashlib.sha1(content).hexdigest(), options.file()
+    script = options.execute() or ''
+    return hashlib.sha1(script).hexdigest(), script
+
+
+def normalize_options(options):
+    """
+    The command line options, minus the script's path, with the -D and
+    -param pairs sorted so that equal options compare equal.
+
+    :param options: the options the script ran with
+    :type options: PigOptions
+    :rtype: list
+    """
+    args = options.to_cmd_array()
+    flags = []
+    pairs = []
+    i = 0
+    while i < len(args):
+        if args[i] == '-file':
+            i += 2
+        elif args[i] == '-param':
+            pairs.append(args[i:i + 2])
+            i += 2
+        elif args[i].startswith('-D'):
+            pairs.append([args[i]])
+            i += 1
+        else:
+            flags.append(args[i])
+            i += 1
+    return sum(sorted(pairs), []) + flags
+
+
+def baseline_options(options, params=None):
+    """
+    The normalized options that decide which baseline a run belongs to:
+    everything but the -param values, which typically change from run to
+    run (e.g. a date), unless they are named.
+
+    :param list options: options from normalize_options
+    :param list params: the names of params whose values separate baselines
+    :rtype: list
+    """
+    params = set(params or [])
+    kept = []
+    i = 0
+    while i < len(options):
+        if options[i] == '-param':
+            if options[i + 1].partition('=')[0] in params:
+                kept += options[i:i + 2]
+            i += 2
+        else:
+            kept.append(options[i])
+            i += 1
+    return kept
+
+
+class RunHistory(object):
+    """
+    A SQLite backed history of pig runs. Runs are written in batches on a
+    background thread so recording them doesn't hold up the caller.
+    """
+
+    def __init__(self, path, batch_size=100, flush_interval=5.0):
+        """
+        :param str path: the SQLite database to record runs in
+        :param int batch_size: the most runs written in one transaction
+        :param float flush_interval: the longest a run waits to be written
+        """
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = Queue()
+        self._writer = Thread(target=self._write)
+
+        # thread dies with the program; anything pending is written at exit
+        self._writer.daemon = True
+        self._writer.start()
+        atexit.register(self.close)
+
+    def record(self, options, code, started, duration, output=None,
+               error=None):
+        """
+        Queues a run to be written.
+
+        :param options: the options the script ran with
+        :type options: PigOptions
+        :param int code: pig's exit code
+        :param float started: when the run started, in seconds since the epoch
+        :param float duration: how long the run took, in seconds
+        :param list output: pig's output lines
+        :param list error: pig's error lines
+        """
+        digest, script = script_identity(options)
+        counters = parse_counters((output or []) + (error or []))
+        self._queue.put((
+            digest,
+            script,
+            json.dumps(normalize_options(options)),
+            code,
+            started,
+            duration,
+            json.dumps(counters, sort_keys=True),
+        ))
+
+    def flush(self):
+        """ Blocks until every queued run has been written. """
+        if self._writer.is_alive():
+            self._queue.put(_FLUSH)
+            self._queue.join()
+
+    def close(self):
+        """ Writes any queued runs and stops the writer thread. """
+        if self._writer.is_alive():
+            self._queue.put(_STOP)
+            self._queue.join()
+            self._writer.join()
+
+    def _write(self):
+        """ Writes queued runs, a transaction per batch. """
+        connection = _connect(self.path)
+        stop = False
+        while not stop:
+            batch = [self._queue.get()]
+            deadline = time.time() + self.flush_interval
+            while len(batch) < self.batch_size and \
+                    batch[-1] is not _FLUSH and batch[-1] is not _STOP:
+                try:
+                    batch.append(self._queue.get(
+                        timeout=max(0, deadline - time.time())))
+                except Empty:
+                    break
+            stop = batch[-1] is _STOP
+            rows = [r for r in batch if r is not _FLUSH and r is not _STOP]
+            try:
+                if len(rows) > 0:
+                    with connection:
+                        connection.executemany(_INSERT, rows)
+            except sqlite3.Error as e:
+                logger.error('Unable to record {} runs: {}'.format(
+                    len(rows), e))
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+        connection.close()
+
+    def runs(self, script_hash=None, limit=None, successful=False,
+             options=None):
+        """
+        Queries recorded runs, most recent first.
+
+        :param str script_hash: only runs of this script
+        :param int limit: the most runs to return
+        :param bool successful: only runs that exited with 0
+        :param list options: only runs with these normalized options
+        :rtype: list
+        """
+        self.flush()
+        return query_runs(self.path, script_hash, limit, successful, options)
+
+    def regressions(self, window=20, threshold=3.0, min_runs=5, params=None):
+        """
+        See find_regressions.
+        """
+        self.flush()
+        return find_regressions(
+            self.path, window, threshold, min_runs, params)
+
+
+def _connect(path):
+    """ Opens the database, creating the runs table if needed. """
+    connection = sqlite3.connect(path)
+    connection.executescript(_SCHEMA)
+    return connection
+
+
+def query_runs(path, script_hash=None, limit=None, successful=False,
+               options=None):
+    """
+    Queries the runs recorded in a database, most recent first.
+
+    :param str path: the SQLite database
+    :param str script_hash: only runs of this script
+    :param int limit: the most runs to return
+    :param bool successful: only runs that exited with 0
+    :param list options: only runs with these normalized options, see
+     normalize_options
+    :returns: a dict per run, with the options and counters decoded
+    :rtype: list
+    """
+    sql = 'SELECT script_hash, script, options, exit_code, started, ' \
+          'duration, counters FROM runs'
+    where = []
+    args = []
+    if script_hash is not None:
+        where.append('script_hash = ?')
+        args.append(script_hash)
+    if options is not None:
+        where.append('options = ?')
+        args.append(json.dumps(options))
+    if successful:
+        where.append('exit_code = 0')
+    if len(where) > 0:
+        sql += ' WHERE ' + ' AND '.join(where)
+    sql += ' ORDER BY started DESC, id DESC'
+    if limit is not None:
+        sql += ' LIMIT ?'
+        args.append(limit)
+
+    connection = _connect(path)
+    try:
+        rows = connection.execute(sql, args).fetchall()
+    finally:
+        connection.close()
+    return [
+        {
+            'script_hash': row[0],
+            'script': row[1],
+            'options': json.loads(row[2]),
+            'exit_code': row[3],
+            'started': row[4],
+            'duration': row[5],
+            'counters': json.loads(row[6]),
+        }
+        for row in rows
+    ]
+
+
+def _metric(run, metric):
+    """ A metric of a run, or None if it wasn't recorded. """
+    if metric == 'duration':
+        return run['duration']
+    return run['counters'].get(metric, None)
+
+
+def find_regressions(path, window=20, threshold=3.0, min_runs=5,
+                     params=None):
+    """
+    Compares each script's latest successful run with the successful runs
+    before it, flagging metrics more than threshold standard deviations from
+    their mean. Runs with different options, e.g. exectype or -D settings,
+    have separate baselines; see baseline_options.
+
+    :param str path: the SQLite database
+    :param int window: the number of earlier runs making up the baseline
+    :param float threshold: the z-score beyond which a metric is flagged
+    :param int min_runs: the fewest earlier runs worth comparing against; at
+     least 2, as the baseline's standard deviation needs two runs
+    :param list params: the names of params whose values separate baselines
+    :returns: a dict per flagged metric
+    :rtype: list
+    """
+    assert min_runs >= 2, 'min_runs must be at least 2'
+    connection = _connect(path)
+    try:
+        hashes = [row[0] for row in connection.execute(
+            'SELECT DISTINCT script_hash FROM runs WHERE exit_code = 0')]
+    finally:
+        connection.close()
+
+    groups = dict()
+    for script_hash in hashes:
+        for run in query_runs(path, script_hash, successful=True):
+            options = baseline_options(run['options'], params)
+            groups.setdefault((script_hash, tuple(options)), []).append(run)
+
+    flagged = []
+    for (script_hash, options), runs in sorted(groups.iteritems()):
+        options = list(options)
+        runs = runs[:window + 1]
+        if len(runs) < min_runs + 1:
+            continue
+        latest, baseline = runs[0], runs[1:]
+        for metric in METRICS:
+            value = _metric(latest, metric)
+            values = [_metric(r, metric) for r in baseline]
+            values = [v for v in values if v is not None]
+            if value is None or len(values) < min_runs:
+                continue
+            mean = sum(values) / float(len(values))
+            stdev = math.sqrt(
+                sum((v - mean) ** 2 for v in values) / (len(values) - 1))
+            if stdev == 0:
+                z = 0.0 if value == mean else float('inf')
+            else:
+                z = (value - mean) / stdev
+            if abs(z) > threshold:
+                flagged.append({
+                    'script_hash': script_hash,
+                    'script': latest['script'],
+                    'options': options,
+                    'metric': metric,
+                    'value': value,
+                    'mean': mean,
+                    'stdev': stdev,
+                    'z': z,
+                })
+    return flagged
+
+
+def main(argv=None):
+    """
+    Prints the scripts whose latest run regressed.
+
+    :returns: 1 if any script regressed, for failing CI jobs, else 0
+    :rtype: int
+    """
+    parser = argparse.ArgumentParser(
+        description='Flags pig scripts whose latest run deviates from their '
+                    'recent history.')
+    parser.add_argument('database', help='the run history database')
+    parser.add_argument('--window', type=int, default=20,
+                        help='earlier runs making up the baseline')
+    parser.add_argument('--threshold', type=float, default=3.0,
+                        help='z-score beyond which a run is flagged')
+    parser.add_argument('--min-runs', type=int, default=5,
+                        help='fewest earlier runs worth comparing against')
+    parser.add_argument('--param', action='append', dest='params',
+                        metavar='NAME',
+                        help='a param whose values get separate baselines')
+    args = parser.parse_args(argv)
+    if args.min_runs < 2:
+        parser.error('--min-runs must be at least 2')
+
+    flagged = find_regressions(
+        args.database, args.window, args.threshold, args.min_runs,
+        args.params)
+    for regression in flagged:
+        print('{} ({}) [{}]: {} was {:g}, baseline {:g} +/- {:g} '
+              '(z={:.1f})'.format(regression['script'],
+                                  regression['script_hash'][:12],
+                                  ' '.join(regression['options']),
+                                  regression['metric'],
+                                  regression['value'],
+                                  regression['mean'],
+                                  regression['stdev'],
+                                  regression['z']))
+    return 1 if len(flagged) > 0 else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,375 @@
+""" Columnar storage for relations in the in-process runner. """
+
+
+from pigthon.latin.parser import UnsupportedScript
+import numpy as np
+
+
+NUMERIC = ['int', 'long', 'float', 'double']
+
+_DTYPES = {
+    'int': np.int64,
+    'long': np.int64,
+    'float': np.float64,
+    'double': np.float64,
+    'boolean': np.bool_,
+    'chararray': object,
+    'bytearray': object,
+}
+
+# the values java's int and long can hold; ints are stored as int64, so
+# they are wrapped to 32 bits after every operation that could overflow
+INT_RANGES = {
+    'int': (-2 ** 31, 2 ** 31 - 1),
+    'long': (-2 ** 63, 2 ** 63 - 1),
+}
+
+# what a null slot holds, so that vectorized operations never see None
+_FILL = {
+    'int': 0,
+    'long': 0,
+    'float': 0.0,
+    'double': 0.0,
+    'boolean': False,
+    'chararray': '',
+    'bytearray': '',
+}
+
+
+class Column(object):
+    """ A column of scalars: their values and which of them are null. """
+
+    def __init__(self, values, nulls, type):
+        """
+        :param numpy.ndarray values: the values; null slots hold a filler
+        :param numpy.ndarray nulls: True where the value is null
+        :param str type: the pig type of the values
+        """
+        self.values = values
+        self.nulls = nulls
+        self.type = type
+
+    def __len__(self):
+        return len(self.values)
+
+    @classmethod
+    def from_list(cls, values, type):
+        """ Builds a column from python values, where None is null. """
+        nulls = np.array([v is None for v in values], dtype=np.bool_)
+        fill = _FILL[type]
+        array = np.empty(len(values), dtype=_DTYPES[type])
+        array[:] = [fill if v is None else v for v in values]
+        return cls(array, nulls, type)
+
+    @classmethod
+    def constant(cls, value, type, length):
+        """ Builds a column repeating one value. """
+        array = np.empty(length, dtype=_DTYPES[type])
+        array[:] = _FILL[type] if value is None else value
+        return cls(array, np.repeat(value is None, length), type)
+
+    def take(self, indices):
+        """ The rows at the indices supplied. """
+        return Column(self.values[indices], self.nulls[indices], self.type)
+
+    def cast(self, type):
+        """
+        Converts the column to another type; values that do not convert
+        become null.
+        """
+        if type == self.type:
+            return self
+        if type in INT_RANGES and self.type in {'float', 'double'}:
+            # java saturates, and casts NaN to 0
+            low, high = INT_RANGES[type]
+            values = np.nan_to_num(np.trunc(self.values))
+            above = values >= high
+            below = values <= low
+            values = np.where(above | below, 0, values).astype(np.int64)
+            values[above] = high
+            values[below] = low
+            return Column(values, self.nulls, type)
+        if type in NUMERIC and self.type in NUMERIC + ['boolean']:
+            values = self.values.astype(_DTYPES[type])
+            return Column(wrap_int(values, type), self.nulls, type)
+        if type in NUMERIC and self.type in {'chararray', 'bytearray'}:
+            return _parse(self.values, self.nulls, type)
+        if type in {'chararray', 'bytearray'}:
+            values = np.empty(len(self), dtype=object)
+            values[:] = format_column(self)
+            values[self.nulls] = ''
+            return Column(values, self.nulls, type)
+        raise UnsupportedScript(
+            'cast from {} to {}'.format(self.type, type))
+
+    def ranks(self):
+        """
+        Dense ranks of the values in sort order; null ranks lowest, at 0.
+        """
+        ranks = np.zeros(len(self), dtype=np.int64)
+        present = ~self.nulls
+        if present.any():
+            uniques, inverse = np.unique(
+                self.values[present], return_inverse=True)
+            ranks[present] = inverse + 1
+        return ranks
+
+
+class TupleColumn(object):
+    """ A column of tuples, stored as one column per field. """
+
+    type = 'tuple'
+
+    def __init__(self, names, columns):
+        self.names = names
+        self.columns = columns
+        self.nulls = np.zeros(len(columns[0]), dtype=np.bool_)
+
+    def __len__(self):
+        return len(self.columns[0])
+
+    def take(self, indices):
+        return TupleColumn(self.names, [c.take(indices) for c in self.columns])
+
+    def ranks(self):
+        return combine_ranks([c.ranks() for c in self.columns])
+
+
+class BagColumn(object):
+    """
+    A column of bags. The rows of every bag live in one relation; order lists
+    them bag by bag and starts/sizes locate each bag within order.
+    """
+
+    type = 'bag'
+
+    def __init__(self, relation, order, sizes):
+        """
+        :param Relation relation: holds the rows of every bag
+        :param numpy.ndarray order: indices into relation, grouped by bag
+        :param numpy.ndarray sizes: the number of rows in each bag
+        """
+        self.relation = relation
+        self.order = order
+        self.sizes = sizes
+        self.starts = np.cumsum(sizes) - sizes
+        self.nulls = np.zeros(len(sizes), dtype=np.bool_)
+
+    def __len__(self):
+        return len(self.sizes)
+
+    def take(self, indices):
+        sizes = self.sizes[indices]
+        offsets = np.cumsum(sizes) - sizes
+        positions = np.repeat(self.starts[indices] - offsets, sizes) + \
+            np.arange(sizes.sum())
+        return BagColumn(self.relation, self.order[positions], sizes)
+
+    def bag_ids(self):
+        """ The bag each entry of order belongs to. """
+        return np.repeat(np.arange(len(self.sizes)), self.sizes)
+
+    def rows(self):
+        """ The relation's rows, in bag order. """
+        return self.relation.take(self.order)
+
+    def reduce(self, ufunc, column, fill):
+        """
+        Reduces a column of the bags' relation, bag by bag, skipping nulls.
+
+        :param numpy.ufunc ufunc: the reduction, e.g. numpy.add
+        :param Column column: a column of self.relation
+        :param fill: the ufunc's identity, which stands in for nulls
+        :returns: the reduced values and the number of non-null values
+        :rtype: tuple(numpy.ndarray, numpy.ndarray)
+        """
+        values = column.values[self.order].copy()
+        present = ~column.nulls[self.order]
+        values[~present] = fill
+        result = np.empty(len(self.sizes), dtype=values.dtype)
+        result[:] = fill
+        nonempty = self.sizes > 0
+        if nonempty.any():
+            result[nonempty] = ufunc.reduceat(values, self.starts[nonempty])
+        counts = np.zeros(len(self.sizes), dtype=np.int64)
+        if nonempty.any():
+            counts[nonempty] = np.add.reduceat(
+                present.astype(np.int64), self.starts[nonempty])
+        return result, counts
+
+    def ranks(self):
+        raise UnsupportedScript('comparing bags')
+
+
+class Relation(object):
+    """ A named list of columns of equal length. """
+
+    def __init__(self, fields, columns, length):
+        """
+        :param list fields: the field names, None for unnamed fields
+        :param list columns: the columns, one per field
+        :param int length: the number of rows
+        """
+        self.fields = fields
+        self.columns = columns
+        self.length = length
+
+    def __len__(self):
+        return self.length
+
+    def take(self, indices):
+        """ The rows at the indices supplied. """
+        return Relation(
+            self.fields,
+            [c.take(indices) for c in self.columns],
+            len(indices)
+        )
+
+    def index(self, name):
+        """
+        Finds a field by name. A name without a prefix matches a prefixed
+        field, e.g. x matches A::x, as long as only one field matches.
+        """
+        if name in self.fields:
+            return self.fields.index(name)
+        matches = [
+            i for i, field in enumerate(self.fields)
+            if field is not None and field.split('::')[-1] == name
+        ]
+        if len(matches) != 1:
+            raise UnsupportedScript('unable to resolve field ' + name)
+        return matches[0]
+
+    def ranks(self):
+        """ Dense ranks of the rows, ordering by every field. """
+        return combine_ranks([c.ranks() for c in self.columns])
+
+
+def combine_ranks(ranks):
+    """
+    Combines per-column ranks into dense ranks of the rows, ordering by each
+    column in turn.
+    """
+    combined = ranks[0]
+    for rank in ranks[1:]:
+        combined = combined * (rank.max() + 1 if len(rank) else 1) + rank
+        combined = np.unique(combined, return_inverse=True)[1]
+    return combined
+
+
+def wrap_int(values, type):
+    """
+    Wraps int64 values to 32 bits if type is int, as java's int arithmetic
+    overflows.
+    """
+    if type == 'int':
+        return values.astype(np.int32).astype(np.int64)
+    return values
+
+
+def _parse(strings, nulls, type):
+    """
+    Parses a column of strings into numbers, nulling what won't parse or is
+    out of the type's range, as pig's CastUtils does.
+    """
+    dtype = _DTYPES[type]
+    present = ~nulls
+    values = np.zeros(len(strings), dtype=dtype)
+    nulls = nulls.copy()
+    try:
+        values[present] = np.array(
+            list(strings[present]), dtype=str).astype(dtype)
+    except (ValueError, OverflowError):
+        convert = int if type in INT_RANGES else float
+        for i in np.flatnonzero(present):
+            try:
+                value = convert(strings[i].strip())
+            except ValueError:
+                try:
+                    value = convert(float(strings[i]))
+                except (ValueError, OverflowError):
+                    nulls[i] = True
+                    continue
+            if type in INT_RANGES and not \
+                    INT_RANGES[type][0] <= value <= INT_RANGES[type][1]:
+                nulls[i] = True
+                continue
+            values[i] = value
+    if type == 'int':
+        low, high = INT_RANGES[type]
+        outside = present & ((values < low) | (values > high))
+        nulls |= outside
+        values[outside] = 0
+    return Column(values, nulls, type)
+
+
+# -----------------------------------------------------------------------------
+# formatting
+# -----------------------------------------------------------------------------
+
+def format_double(value, type='double'):
+    """ Formats a float the way java's Double/Float.toString would. """
+    value = np.float32(value) if type == 'float' else float(value)
+    if value != value:
+        return 'NaN'
+    if value in (float('inf'), float('-inf')):
+        return 'Infinity' if value > 0 else '-Infinity'
+    if value == 0:
+        return '-0.0' if np.signbit(value) else '0.0'
+
+    # repr gives the shortest digits that round trip, as java does, and
+    # matches java's layout between 10^-3 and 10^7
+    text = repr(value)
+    if 1e-3 <= abs(value) < 1e7:
+        return text
+    sign = '-' if text.startswith('-') else ''
+    mantissa, _, exponent = text.lstrip('-').partition('e')
+    whole, _, fraction = mantissa.partition('.')
+    digits = whole + fraction
+    exponent = int(exponent or 0) + len(whole) - 1
+    significant = digits.lstrip('0')
+    exponent -= len(digits) - len(significant)
+    significant = significant.rstrip('0')
+    return '{}{}.{}E{}'.format(
+        sign, significant[0], significant[1:] or '0', exponent)
+
+
+def format_column(column):
+    """
+    Formats every value of a column as pig would print it; nulls become
+    empty strings.
+
+    :rtype: list
+    """
+    if isinstance(column, TupleColumn):
+        parts = [format_column(c) for c in column.columns]
+        return ['(' + ','.join(p) + ')' for p in zip(*parts)]
+    if isinstance(column, BagColumn):
+        rows = format_rows(column.rows())
+        tuples = ['(' + ','.join(r) + ')' for r in rows]
+        return [
+            '{' + ','.join(tuples[start:start + size]) + '}'
+            for start, size in zip(column.starts, column.sizes)
+        ]
+    nulls = column.nulls
+    if column.type in {'float', 'double'}:
+        text = [format_double(v, column.type) for v in column.values]
+    elif column.type == 'boolean':
+        text = ['true' if v else 'false' for v in column.values]
+    elif column.type in {'int', 'long'}:
+        text = [str(v) for v in column.values.tolist()]
+    else:
+        text = list(column.values)
+    return ['' if null else t for t, null in zip(text, nulls)]
+
+
+def format_rows(relation):
+    """
+    Formats every row of a relation as a list of field strings.
+
+    :rtype: list
+    """
+    if len(relation.columns) == 0:
+        return [[] for _ in range(len(relation))]
+    return [list(r) for r in zip(*[format_column(c)
+                                   for c in relation.columns])]
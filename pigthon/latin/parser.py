@@ -0,0 +1,682 @@
+""" Parses the subset of Pig Latin the in-process runner supports. """
+
+
+from pigthon.util.params import param_values, strip_comments, \
+    strip_directives
+import re
+
+
+class UnsupportedScript(Exception):
+    """ Raised when a script uses Pig Latin the runner cannot execute. """
+    pass
+
+
+# -----------------------------------------------------------------------------
+# statements
+# -----------------------------------------------------------------------------
+
+class Load(object):
+    """ alias = LOAD 'path' [USING PigStorage('delim')] [AS (schema)]; """
+
+    def __init__(self, alias, path, delimiter, schema):
+        self.alias = alias
+        self.path = path
+        self.delimiter = delimiter
+        self.schema = schema
+
+
+class Filter(object):
+    """ alias = FILTER source BY condition; """
+
+    def __init__(self, alias, source, condition):
+        self.alias = alias
+        self.source = source
+        self.condition = condition
+
+
+class Foreach(object):
+    """ alias = FOREACH source GENERATE item, ...; """
+
+    def __init__(self, alias, source, items):
+        self.alias = alias
+        self.source = source
+        self.items = items
+
+
+class GenerateItem(object):
+    """ An expression in a GENERATE, optionally flattened and renamed. """
+
+    def __init__(self, expr, flatten=False, names=None):
+        self.expr = expr
+        self.flatten = flatten
+        self.names = names
+
+
+class Group(object):
+    """ alias = GROUP source BY key | ALL; keys is None for ALL. """
+
+    def __init__(self, alias, source, keys):
+        self.alias = alias
+        self.source = source
+        self.keys = keys
+
+
+class Join(object):
+    """ alias = JOIN source BY key, source BY key; """
+
+    def __init__(self, alias, inputs):
+        self.alias = alias
+        self.inputs = inputs
+
+
+class Order(object):
+    """ alias = ORDER source BY key [ASC|DESC], ...; """
+
+    def __init__(self, alias, source, keys):
+        self.alias = alias
+        self.source = source
+        self.keys = keys
+
+
+class Distinct(object):
+    """ alias = DISTINCT source; """
+
+    def __init__(self, alias, source):
+        self.alias = alias
+        self.source = source
+
+
+class Limit(object):
+    """ alias = LIMIT source count; """
+
+    def __init__(self, alias, source, count):
+        self.alias = alias
+        self.source = source
+        self.count = count
+
+
+class Store(object):
+    """ STORE source INTO 'path' [USING PigStorage('delim')]; """
+
+    def __init__(self, source, path, delimiter):
+        self.source = source
+        self.path = path
+        self.delimiter = delimiter
+
+
+class Dump(object):
+    """ DUMP source; """
+
+    def __init__(self, source):
+        self.source = source
+
+
+# -----------------------------------------------------------------------------
+# expressions
+# -----------------------------------------------------------------------------
+
+class Field(object):
+    """ A reference to a field by name. """
+
+    def __init__(self, name):
+        self.name = name
+
+
+class Position(object):
+    """ A reference to a field by position, e.g. $0. """
+
+    def __init__(self, index):
+        self.index = index
+
+
+class Star(object):
+    """ Every field, i.e. *. """
+    pass
+
+
+class Const(object):
+    """ A literal value of a pig type. """
+
+    def __init__(self, value, type):
+        self.value = value
+        self.type = type
+
+
+class BinOp(object):
+    """ Arithmetic, comparison and boolean operators. """
+
+    def __init__(self, op, left, right):
+        self.op = op
+        self.left = left
+        self.right = right
+
+
+class Negate(object):
+    """ Unary minus. """
+
+    def __init__(self, expr):
+        self.expr = expr
+
+
+class Not(object):
+    """ Boolean NOT. """
+
+    def __init__(self, expr):
+        self.expr = expr
+
+
+class IsNull(object):
+    """ IS NULL, or IS NOT NULL when negated. """
+
+    def __init__(self, expr, negated):
+        self.expr = expr
+        self.negated = negated
+
+
+class Cast(object):
+    """ (type) expression. """
+
+    def __init__(self, type, expr):
+        self.type = type
+        self.expr = expr
+
+
+class Bincond(object):
+    """ condition ? when_true : when_false. """
+
+    def __init__(self, condition, when_true, when_false):
+        self.condition = condition
+        self.when_true = when_true
+        self.when_false = when_false
+
+
+class Func(object):
+    """ A call to a builtin function. """
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+
+
+class Deref(object):
+    """ Projection of a field out of a tuple or bag, e.g. A.x. """
+
+    def __init__(self, expr, field):
+        self.expr = expr
+        self.field = field
+
+
+class TupleExpr(object):
+    """ A parenthesised list of expressions, e.g. the keys (a, b). """
+
+    def __init__(self, exprs):
+        self.exprs = exprs
+
+
+# -----------------------------------------------------------------------------
+# tokenizing
+# -----------------------------------------------------------------------------
+
+TYPES = {'int', 'long', 'float', 'double', 'chararray', 'bytearray', 'boolean'}
+
+_TOKEN = re.compile(r'''
+    (?P<space>\s+)
+  | (?P<string>'(?:[^'\\]|\\.)*')
+  | (?P<number>(?:\d+\.\d*|\.\d+)(?:[eE][-+]?\d+)?[fF]?
+              |\d+[eE][-+]?\d+[fF]?|\d+[lLfF]?)
+  | (?P<position>\$\d+)
+  | (?P<ident>[A-Za-z_]\w*(?:::[A-Za-z_]\w*)*)
+  | (?P<op>==|!=|<=|>=|[-+*/%<>(){},.=?:;])
+''', re.VERBOSE)
+
+_ESCAPES = {'n': '\n', 't': '\t', 'r': '\r', '\\': '\\', '\'': '\''}
+
+
+class Token(object):
+    """ A lexical token: its kind and text. """
+
+    def __init__(self, kind, text):
+        self.kind = kind
+        self.text = text
+
+    def keyword(self):
+        """ The token's text, upper cased if it could be a keyword. """
+        return self.text.upper() if self.kind == 'ident' else self.text
+
+
+def tokenize(text):
+    """
+    Splits a statement into tokens.
+
+    :param str text: the statement, without its trailing semicolon
+    :rtype: list
+    """
+    tokens = []
+    pos = 0
+    while pos < len(text):
+        match = _TOKEN.match(text, pos)
+        if match is None:
+            raise UnsupportedScript(
+                'unexpected character {!r}'.format(text[pos]))
+        pos = match.end()
+        if match.lastgroup != 'space':
+            tokens.append(Token(match.lastgroup, match.group(0)))
+    return tokens
+
+
+def _unquote(text):
+    """ The value of a quoted string literal. """
+    return re.sub(
+        r'\\(.)',
+        lambda m: _ESCAPES.get(m.group(1), m.group(1)),
+        text[1:-1]
+    )
+
+
+# -----------------------------------------------------------------------------
+# preprocessing
+# -----------------------------------------------------------------------------
+
+_PARAM = re.compile(r'\$(?:\{(?P<braced>\w+)\}|(?P<name>[A-Za-z_]\w*))')
+
+
+def substitute_params(text, params=None):
+    """
+    Applies %default and %declare directives and the parameters supplied,
+    the way pig's parameter substitution does.
+
+    :param str text: the script
+    :param dict params: values supplied on the command line, which override
+     %default
+    :rtype: str
+    """
+    values = param_values(text, params)
+    text = strip_directives(text)
+
+    def _replace(match):
+        name = match.group('braced') or match.group('name')
+        if name not in values:
+            raise UnsupportedScript('undefined parameter {}'.format(name))
+        return values[name]
+
+    return _PARAM.sub(_replace, text)
+
+
+def split_statements(text):
+    """ Splits a script on semicolons outside of string literals. """
+    statements = []
+    current = []
+    quoted = False
+    i = 0
+    while i < len(text):
+        c = text[i]
+        if quoted and c == '\\':
+            current.append(text[i:i + 2])
+            i += 2
+            continue
+        if c == '\'':
+            quoted = not quoted
+        if c == ';' and not quoted:
+            statements.append(''.join(current).strip())
+            current = []
+        else:
+            current.append(c)
+        i += 1
+    if ''.join(current).strip():
+        statements.append(''.join(current).strip())
+    return [s for s in statements if s]
+
+
+# -----------------------------------------------------------------------------
+# parsing
+# -----------------------------------------------------------------------------
+
+class _Parser(object):
+    """ Recursive descent parser over the tokens of one statement. """
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.pos = 0
+
+    def peek(self, offset=0):
+        index = self.pos + offset
+        return self.tokens[index] if index < len(self.tokens) else None
+
+    def at(self, *keywords):
+        token = self.peek()
+        return token is not None and token.keyword() in keywords
+
+    def next(self):
+        token = self.peek()
+        if token is None:
+            raise UnsupportedScript('unexpected end of statement')
+        self.pos += 1
+        return token
+
+    def expect(self, keyword):
+        token = self.next()
+        if token.keyword() != keyword:
+            raise UnsupportedScript(
+                'expected {} but found {}'.format(keyword, token.text))
+        return token
+
+    def accept(self, keyword):
+        if self.at(keyword):
+            return self.next()
+        return None
+
+    def done(self):
+        if self.peek() is not None:
+            raise UnsupportedScript(
+                'unsupported syntax near {}'.format(self.peek().text))
+
+    def alias(self):
+        token = self.next()
+        if token.kind != 'ident':
+            raise UnsupportedScript('expected an alias, found ' + token.text)
+        return token.text
+
+    def string(self):
+        token = self.next()
+        if token.kind != 'string':
+            raise UnsupportedScript('expected a string, found ' + token.text)
+        return _unquote(token.text)
+
+    # statements --------------------------------------------------------------
+
+    def statement(self):
+        if self.at('STORE'):
+            self.next()
+            source = self.alias()
+            self.expect('INTO')
+            path = self.string()
+            statement = Store(source, path, self.storage())
+        elif self.at('DUMP'):
+            self.next()
+            statement = Dump(self.alias())
+        else:
+            alias = self.alias()
+            self.expect('=')
+            keyword = self.next().keyword()
+            handler = getattr(self, 'op_' + keyword.lower(), None)
+            if handler is None:
+                raise UnsupportedScript('unsupported operator ' + keyword)
+            statement = handler(alias)
+        self.done()
+        return statement
+
+    def storage(self):
+        """ Parses an optional USING PigStorage('delim') clause. """
+        delimiter = '\t'
+        if self.accept('USING'):
+            func = self.next()
+            if func.text not in {'PigStorage',
+                                 'org.apache.pig.builtin.PigStorage'}:
+                raise UnsupportedScript('unsupported storage ' + func.text)
+            self.expect('(')
+            if not self.at(')'):
+                delimiter = self.string()
+            self.expect(')')
+        return delimiter
+
+    def op_load(self, alias):
+        path = self.string()
+        delimiter = self.storage()
+        schema = None
+        if self.accept('AS'):
+            schema = []
+            parenthesised = self.accept('(') is not None
+            while True:
+                name = self.alias()
+                type = 'bytearray'
+                if self.accept(':'):
+                    type = self.next().text.lower()
+                    if type not in TYPES:
+                        raise UnsupportedScript('unsupported type ' + type)
+                schema.append((name, type))
+                if not parenthesised or not self.accept(','):
+                    break
+            if parenthesised:
+                self.expect(')')
+        return Load(alias, path, delimiter, schema)
+
+    def op_filter(self, alias):
+        source = self.alias()
+        self.expect('BY')
+        return Filter(alias, source, self.expr())
+
+    def op_foreach(self, alias):
+        source = self.alias()
+        self.expect('GENERATE')
+        items = [self.generate_item()]
+        while self.accept(','):
+            items.append(self.generate_item())
+        return Foreach(alias, source, items)
+
+    def generate_item(self):
+        flatten = False
+        if self.at('FLATTEN') and self.peek(1) is not None and \
+                self.peek(1).text == '(':
+            self.next()
+            self.next()
+            expr = self.expr()
+            self.expect(')')
+            flatten = True
+        elif self.accept('*'):
+            expr = Star()
+        else:
+            expr = self.expr()
+        names = None
+        if self.accept('AS'):
+            if self.accept('('):
+                names = [self.schema_name()]
+                while self.accept(','):
+                    names.append(self.schema_name())
+                self.expect(')')
+            else:
+                names = [self.schema_name()]
+        return GenerateItem(expr, flatten, names)
+
+    def schema_name(self):
+        name = self.alias()
+        if self.accept(':'):
+            self.next()
+            raise UnsupportedScript('typed GENERATE schemas')
+        return name
+
+    def op_group(self, alias):
+        source = self.alias()
+        if self.accept('ALL'):
+            return Group(alias, source, None)
+        self.expect('BY')
+        return Group(alias, source, self.keys())
+
+    def op_cogroup(self, alias):
+        raise UnsupportedScript('COGROUP')
+
+    def keys(self):
+        """ Parses a key expression, or a parenthesised list of them. """
+        expr = self.expr()
+        if isinstance(expr, TupleExpr):
+            return expr.exprs
+        return [expr]
+
+    def op_join(self, alias):
+        inputs = []
+        while True:
+            source = self.alias()
+            self.expect('BY')
+            inputs.append((source, self.keys()))
+            if not self.accept(','):
+                break
+        if len(inputs) != 2:
+            raise UnsupportedScript('JOIN of {} inputs'.format(len(inputs)))
+        return Join(alias, inputs)
+
+    def op_order(self, alias):
+        source = self.alias()
+        self.expect('BY')
+        keys = []
+        while True:
+            expr = self.expr()
+            descending = False
+            if self.accept('DESC'):
+                descending = True
+            else:
+                self.accept('ASC')
+            keys.append((expr, descending))
+            if not self.accept(','):
+                break
+        return Order(alias, source, keys)
+
+    def op_distinct(self, alias):
+        return Distinct(alias, self.alias())
+
+    def op_limit(self, alias):
+        source = self.alias()
+        token = self.next()
+        if token.kind != 'number' or not token.text.isdigit():
+            raise UnsupportedScript('LIMIT by an expression')
+        return Limit(alias, source, int(token.text))
+
+    # expressions -------------------------------------------------------------
+
+    def expr(self):
+        condition = self.or_expr()
+        if self.accept('?'):
+            when_true = self.expr()
+            self.expect(':')
+            return Bincond(condition, when_true, self.expr())
+        return condition
+
+    def or_expr(self):
+        expr = self.and_expr()
+        while self.accept('OR'):
+            expr = BinOp('or', expr, self.and_expr())
+        return expr
+
+    def and_expr(self):
+        expr = self.not_expr()
+        while self.accept('AND'):
+            expr = BinOp('and', expr, self.not_expr())
+        return expr
+
+    def not_expr(self):
+        if self.accept('NOT'):
+            return Not(self.not_expr())
+        return self.comparison()
+
+    def comparison(self):
+        expr = self.additive()
+        if self.at('==', '!=', '<', '>', '<=', '>='):
+            return BinOp(self.next().text, expr, self.additive())
+        if self.accept('IS'):
+            negated = self.accept('NOT') is not None
+            self.expect('NULL')
+            return IsNull(expr, negated)
+        if self.at('MATCHES'):
+            raise UnsupportedScript('MATCHES')
+        return expr
+
+    def additive(self):
+        expr = self.multiplicative()
+        while self.at('+', '-'):
+            expr = BinOp(self.next().text, expr, self.multiplicative())
+        return expr
+
+    def multiplicative(self):
+        expr = self.unary()
+        while self.at('*', '/', '%'):
+            expr = BinOp(self.next().text, expr, self.unary())
+        return expr
+
+    def unary(self):
+        if self.accept('-'):
+            return Negate(self.unary())
+        if self.at('(') and self.peek(1) is not None and \
+                self.peek(1).text.lower() in TYPES and \
+                self.peek(2) is not None and self.peek(2).text == ')':
+            self.next()
+            type = self.next().text.lower()
+            self.next()
+            return Cast(type, self.unary())
+        return self.postfix()
+
+    def postfix(self):
+        expr = self.primary()
+        while self.accept('.'):
+            token = self.next()
+            if token.kind == 'ident':
+                expr = Deref(expr, Field(token.text))
+            elif token.kind == 'position':
+                expr = Deref(expr, Position(int(token.text[1:])))
+            else:
+                raise UnsupportedScript('projection of ' + token.text)
+        return expr
+
+    def primary(self):
+        token = self.next()
+        if token.kind == 'string':
+            return Const(_unquote(token.text), 'chararray')
+        if token.kind == 'number':
+            return _number(token.text)
+        if token.kind == 'position':
+            return Position(int(token.text[1:]))
+        if token.text == '(':
+            exprs = [self.expr()]
+            while self.accept(','):
+                exprs.append(self.expr())
+            self.expect(')')
+            return exprs[0] if len(exprs) == 1 else TupleExpr(exprs)
+        if token.kind == 'ident':
+            keyword = token.keyword()
+            if keyword == 'NULL':
+                return Const(None, 'bytearray')
+            if keyword in {'TRUE', 'FALSE'}:
+                return Const(keyword == 'TRUE', 'boolean')
+            if self.at('('):
+                self.next()
+                args = []
+                if not self.at(')'):
+                    args.append(self.expr())
+                    while self.accept(','):
+                        args.append(self.expr())
+                self.expect(')')
+                return Func(token.text, args)
+            return Field(token.text)
+        raise UnsupportedScript('unsupported syntax near ' + token.text)
+
+
+def _number(text):
+    """ The constant for a numeric literal. """
+    if text[-1] in 'lL':
+        return Const(int(text[:-1]), 'long')
+    if text[-1] in 'fF':
+        return Const(float(text[:-1]), 'float')
+    if any(c in text for c in '.eE'):
+        return Const(float(text), 'double')
+    value = int(text)
+    return Const(value, 'int' if value < 2 ** 31 else 'long')
+
+
+_IGNORED = {'SET'}
+
+
+def parse(text, params=None):
+    """
+    Parses a script into a list of statements.
+
+    :param str text: the script
+    :param dict params: parameters to substitute into the script
+    :raises UnsupportedScript: if the script uses anything outside of the
+     supported subset
+    :rtype: list
+    """
+    text = substitute_params(strip_comments(text), params)
+    statements = []
+    for statement in split_statements(text):
+        tokens = tokenize(statement)
+        if tokens[0].keyword() in _IGNORED:
+            continue
+        statements.append(_Parser(tokens).statement())
+    return statements
@@ -0,0 +1,575 @@
+"""
+Runs scripts written in a core subset of Pig Latin in-process, using numpy
+to evaluate every operator a column at a time.
+"""
+
+
+from genericpath import exists
+from pigthon.latin.parser import UnsupportedScript, parse
+from pigthon.latin import parser as ast
+from pigthon.util.files import input_files
+from pigthon.util.ptlog import PtLog
+import os
+import re
+
+try:
+    import numpy as np
+    from pigthon.latin.columns import BagColumn, Column, NUMERIC, \
+        Relation, TupleColumn, combine_ranks, format_rows, wrap_int
+except ImportError:
+    np = None
+
+
+logger = PtLog(__name__)
+
+
+_WIDTH = {'int': 0, 'long': 1, 'float': 2, 'double': 3}
+_REMOTE = re.compile(r'^\w+://')
+_GLOB = re.compile(r'[*?\[\]{}]')
+
+# the numpy ufunc each comparison operator applies
+_COMPARISONS = {
+    '==': 'equal',
+    '!=': 'not_equal',
+    '<': 'less',
+    '>': 'greater',
+    '<=': 'less_equal',
+    '>=': 'greater_equal',
+}
+
+# options that make pig do something other than run the script
+_UNSUPPORTED_OPTIONS = [
+    'check', 'dryrun', 'embedded', 'help', 'version', 'param_file'
+]
+
+
+def run_script(options):
+    """
+    Runs the script named by the options in-process.
+
+    :param options: the options to run with
+    :type options: PigOptions or PigTestOptions
+    :raises UnsupportedScript: if the script or options need real pig
+    :returns: the result code, DUMP output, and error output
+    :rtype: tuple(int, list, list)
+    """
+    if np is None:
+        raise UnsupportedScript('numpy is not installed')
+    for option in _UNSUPPORTED_OPTIONS:
+        if options._options.get(option, None):
+            raise UnsupportedScript('the {} option'.format(option))
+
+    if options.file() is not None:
+        with open(options.file(), 'r') as f:
+            text = f.read()
+    elif options.execute() is not None:
+        text = options.execute()
+    else:
+        raise UnsupportedScript('no script to run')
+    return Runner().run(parse(text, options.params()))
+
+
+class Runner(object):
+    """ Executes parsed statements, keeping each alias' relation. """
+
+    def __init__(self):
+        self._relations = dict()
+        # aliases whose rows pass through a reduce phase in real pig, which
+        # decides the name of the part file they are stored in
+        self._reduced = set()
+
+    def run(self, statements):
+        """
+        Executes the statements. Output is only written once every statement
+        has run, so a script that turns out to be unsupported part way
+        through leaves nothing behind for pig to trip over.
+
+        :param list statements: the statements from parser.parse
+        :returns: the result code, DUMP output, and error output
+        :rtype: tuple(int, list, list)
+        """
+        stores = []
+        output = []
+        for statement in statements:
+            if isinstance(statement, ast.Store):
+                stores.append(self._store(statement))
+            elif isinstance(statement, ast.Dump):
+                rows = format_rows(self._relation(statement.source))
+                output += ['(' + ','.join(row) + ')' for row in rows]
+            else:
+                handler = getattr(
+                    self, '_' + type(statement).__name__.lower())
+                self._relations[statement.alias] = handler(statement)
+
+        for path, part, lines in stores:
+            os.makedirs(path)
+            with open(os.path.join(path, part), 'w') as f:
+                for line in lines:
+                    f.write(line + '\n')
+            open(os.path.join(path, '_SUCCESS'), 'w').close()
+        return 0, output, []
+
+    def _relation(self, alias):
+        if alias not in self._relations:
+            raise UnsupportedScript('undefined alias ' + alias)
+        return self._relations[alias]
+
+    def _reduce(self, alias):
+        """ Marks an alias as produced by a reduce phase. """
+        self._reduced.add(alias)
+
+    def _inherit(self, alias, source):
+        """ Marks an alias as reduced if its source is. """
+        if source in self._reduced:
+            self._reduced.add(alias)
+
+    # operators ---------------------------------------------------------------
+
+    def _load(self, statement):
+        path = _local_path(statement.path)
+        if not exists(path):
+            raise UnsupportedScript('input {} does not exist'.format(path))
+
+        rows = []
+        for name in input_files(path):
+            with open(name, 'rb') as f:
+                for line in f:
+                    rows.append(
+                        line.rstrip('\n').rstrip('\r').split(
+                            statement.delimiter))
+
+        schema = statement.schema
+        if schema is None:
+            # pig keeps each row's own width; relations here have just one
+            widths = set(len(row) for row in rows)
+            if len(widths) > 1:
+                raise UnsupportedScript(
+                    'rows of different widths in {}'.format(path))
+            schema = [(None, 'bytearray')] * (widths.pop() if rows else 0)
+
+        columns = []
+        for i, (name, type) in enumerate(schema):
+            values = np.empty(len(rows), dtype=object)
+            values[:] = [row[i] if i < len(row) else None for row in rows]
+            # PigStorage loads empty fields as null, whatever their type
+            nulls = np.array(
+                [v is None or v == '' for v in values], dtype=np.bool_)
+            values[nulls] = ''
+            column = Column(values, nulls, 'bytearray')
+            if type == 'chararray':
+                column = Column(values, nulls, type)
+            columns.append(column.cast(type))
+        return Relation([name for name, _ in schema], columns, len(rows))
+
+    def _filter(self, statement):
+        self._inherit(statement.alias, statement.source)
+        relation = self._relation(statement.source)
+        condition = evaluate(statement.condition, relation)
+        if condition.type != 'boolean':
+            raise UnsupportedScript('FILTER by a non boolean expression')
+        return relation.take(
+            np.flatnonzero(condition.values & ~condition.nulls))
+
+    def _foreach(self, statement):
+        self._inherit(statement.alias, statement.source)
+        relation = self._relation(statement.source)
+        parts = []
+        flattened = None
+        for item in statement.items:
+            if isinstance(item.expr, ast.Star):
+                parts.append((relation.columns, relation.fields))
+                continue
+            column = evaluate(item.expr, relation)
+            name = _name(item.expr, relation)
+            if item.flatten and isinstance(column, TupleColumn):
+                parts.append((column.columns, column.names))
+            elif item.flatten and isinstance(column, BagColumn):
+                if flattened is not None:
+                    raise UnsupportedScript('FLATTEN of more than one bag')
+                flattened = column
+                parts.append((column, [
+                    None if field is None or name is None
+                    else '{}::{}'.format(name, field)
+                    for field in column.relation.fields
+                ]))
+            else:
+                parts.append(([column], [name]))
+            if item.names is not None:
+                names = parts[-1][1]
+                if len(item.names) != len(names):
+                    raise UnsupportedScript('AS with the wrong arity')
+                parts[-1] = (parts[-1][0], item.names)
+
+        rows = np.arange(len(relation))
+        length = len(relation)
+        if flattened is not None:
+            rows = np.repeat(rows, flattened.sizes)
+            length = len(rows)
+
+        columns = []
+        fields = []
+        for part, names in parts:
+            if part is flattened:
+                columns += part.rows().columns
+            elif flattened is not None:
+                columns += [c.take(rows) for c in part]
+            else:
+                columns += part
+            fields += names
+        return Relation(list(fields), columns, length)
+
+    def _group(self, statement):
+        self._reduce(statement.alias)
+        relation = self._relation(statement.source)
+        if statement.keys is None:
+            key = Column.constant('all', 'chararray', len(relation))
+        else:
+            keys = [evaluate(k, relation) for k in statement.keys]
+            key = keys[0]
+            if len(keys) > 1:
+                key = TupleColumn(
+                    [_name(k, relation) for k in statement.keys], keys)
+
+        codes = np.unique(key.ranks(), return_inverse=True)[1]
+        order = np.argsort(codes, kind='mergesort')
+        sizes = np.bincount(codes) if len(codes) else \
+            np.zeros(0, dtype=np.int64)
+        bags = BagColumn(relation, order, sizes)
+        return Relation(
+            ['group', statement.source],
+            [key.take(order[bags.starts]), bags],
+            len(sizes)
+        )
+
+    def _join(self, statement):
+        self._reduce(statement.alias)
+        (left_alias, left_keys), (right_alias, right_keys) = statement.inputs
+        left = self._relation(left_alias)
+        right = self._relation(right_alias)
+        if len(left_keys) != len(right_keys):
+            raise UnsupportedScript('JOIN keys of different arity')
+
+        ranks = []
+        nulls = np.zeros(len(left) + len(right), dtype=np.bool_)
+        for left_key, right_key in zip(left_keys, right_keys):
+            lcol, rcol = _comparable(
+                evaluate(left_key, left), evaluate(right_key, right))
+            both = Column(
+                np.concatenate([lcol.values, rcol.values]),
+                np.concatenate([lcol.nulls, rcol.nulls]),
+                lcol.type
+            )
+            ranks.append(both.ranks())
+            nulls |= both.nulls
+        codes = combine_ranks(ranks)
+        left_codes = np.where(nulls[:len(left)], -1, codes[:len(left)])
+        right_codes = np.where(nulls[len(left):], -2, codes[len(left):])
+
+        # pair every left row with the run of right rows sharing its key
+        right_order = np.argsort(right_codes, kind='mergesort')
+        sorted_codes = right_codes[right_order]
+        lo = np.searchsorted(sorted_codes, left_codes, 'left')
+        counts = np.searchsorted(sorted_codes, left_codes, 'right') - lo
+        left_rows = np.repeat(np.arange(len(left)), counts)
+        offsets = np.arange(counts.sum()) - \
+            np.repeat(np.cumsum(counts) - counts, counts)
+        right_rows = right_order[np.repeat(lo, counts) + offsets]
+
+        # pig emits joined rows grouped by key, in key order
+        order = np.argsort(left_codes[left_rows], kind='mergesort')
+        left_rows = left_rows[order]
+        right_rows = right_rows[order]
+        return Relation(
+            _prefixed(left_alias, left) + _prefixed(right_alias, right),
+            [c.take(left_rows) for c in left.columns] +
+            [c.take(right_rows) for c in right.columns],
+            len(left_rows)
+        )
+
+    def _order(self, statement):
+        self._reduce(statement.alias)
+        relation = self._relation(statement.source)
+        keys = []
+        for expr, descending in statement.keys:
+            ranks = evaluate(expr, relation).ranks()
+            keys.append(-ranks if descending else ranks)
+        return relation.take(np.lexsort(keys[::-1]))
+
+    def _distinct(self, statement):
+        self._reduce(statement.alias)
+        relation = self._relation(statement.source)
+        if len(relation) == 0:
+            return relation
+        first = np.unique(relation.ranks(), return_index=True)[1]
+        return relation.take(first)
+
+    def _limit(self, statement):
+        self._reduce(statement.alias)
+        relation = self._relation(statement.source)
+        return relation.take(np.arange(min(statement.count, len(relation))))
+
+    def _store(self, statement):
+        """ Formats a STORE's output, to be written once the script ends. """
+        relation = self._relation(statement.source)
+        path = _local_path(statement.path)
+        if exists(path):
+            raise UnsupportedScript('output {} already exists'.format(path))
+        part = 'part-r-00000' if statement.source in self._reduced \
+            else 'part-m-00000'
+        lines = [
+            statement.delimiter.join(row) for row in format_rows(relation)
+        ]
+        return path, part, lines
+
+
+def _local_path(path):
+    """ Strips the file: scheme, rejecting paths that aren't local. """
+    if path.startswith('file:'):
+        path = re.sub(r'^file:(//)?', '', path)
+    if _REMOTE.match(path) or _GLOB.search(path):
+        raise UnsupportedScript('non-local path ' + path)
+    return path
+
+
+def _prefixed(alias, relation):
+    """ The field names of a relation, qualified by its alias. """
+    return [
+        None if field is None else '{}::{}'.format(alias, field)
+        for field in relation.fields
+    ]
+
+
+def _name(expr, relation):
+    """ The name pig gives the result of a GENERATE expression. """
+    if isinstance(expr, ast.Field):
+        return relation.fields[relation.index(expr.name)]
+    if isinstance(expr, ast.Position) and expr.index < len(relation.fields):
+        return relation.fields[expr.index]
+    if isinstance(expr, ast.Deref) and isinstance(expr.field, ast.Field):
+        return expr.field.name
+    return None
+
+
+# -----------------------------------------------------------------------------
+# expressions
+# -----------------------------------------------------------------------------
+
+def evaluate(expr, relation):
+    """
+    Evaluates an expression against every row of a relation at once.
+
+    :param expr: an expression from the parser
+    :param Relation relation: the rows to evaluate against
+    :rtype: Column, TupleColumn or BagColumn
+    """
+    if isinstance(expr, ast.Field):
+        return relation.columns[relation.index(expr.name)]
+    if isinstance(expr, ast.Position):
+        if expr.index >= len(relation.columns):
+            raise UnsupportedScript('${} is out of range'.format(expr.index))
+        return relation.columns[expr.index]
+    if isinstance(expr, ast.Const):
+        return Column.constant(expr.value, expr.type, len(relation))
+    if isinstance(expr, ast.BinOp):
+        left = evaluate(expr.left, relation)
+        right = evaluate(expr.right, relation)
+        if expr.op in {'and', 'or'}:
+            return _logical(expr.op, left, right)
+        if expr.op in {'+', '-', '*', '/', '%'}:
+            return _arithmetic(expr.op, left, right)
+        return _compare(expr.op, left, right)
+    if isinstance(expr, ast.Negate):
+        column = evaluate(expr.expr, relation)
+        if column.type == 'bytearray':
+            column = column.cast('double')
+        if column.type not in NUMERIC:
+            raise UnsupportedScript('negating ' + column.type)
+        return Column(
+            wrap_int(-column.values, column.type), column.nulls, column.type)
+    if isinstance(expr, ast.Not):
+        column = _boolean(evaluate(expr.expr, relation))
+        return Column(~column.values, column.nulls, 'boolean')
+    if isinstance(expr, ast.IsNull):
+        nulls = evaluate(expr.expr, relation).nulls
+        return Column(
+            ~nulls if expr.negated else nulls.copy(),
+            np.zeros(len(nulls), dtype=np.bool_),
+            'boolean'
+        )
+    if isinstance(expr, ast.Cast):
+        column = evaluate(expr.expr, relation)
+        if not isinstance(column, Column):
+            raise UnsupportedScript('casting a ' + column.type)
+        return column.cast(expr.type)
+    if isinstance(expr, ast.Bincond):
+        condition = _boolean(evaluate(expr.condition, relation))
+        when_true, when_false = _comparable(
+            evaluate(expr.when_true, relation),
+            evaluate(expr.when_false, relation)
+        )
+        return Column(
+            np.where(condition.values, when_true.values, when_false.values),
+            condition.nulls | np.where(
+                condition.values, when_true.nulls, when_false.nulls),
+            when_true.type
+        )
+    if isinstance(expr, ast.Func):
+        return _aggregate(expr.name.upper(), expr.args, relation)
+    if isinstance(expr, ast.Deref):
+        return _deref(evaluate(expr.expr, relation), expr.field)
+    if isinstance(expr, ast.TupleExpr):
+        columns = [evaluate(e, relation) for e in expr.exprs]
+        return TupleColumn([_name(e, relation) for e in expr.exprs], columns)
+    raise UnsupportedScript('unsupported expression')
+
+
+def _boolean(column):
+    if column.type != 'boolean':
+        raise UnsupportedScript('{} used as a boolean'.format(column.type))
+    return column
+
+
+def _numeric(left, right):
+    """
+    Casts two columns to a common numeric type. bytearray takes the type of
+    the other side, as pig's implicit casts do.
+    """
+    types = {left.type, right.type}
+    if types == {'bytearray'}:
+        type = 'double'
+    elif 'bytearray' in types:
+        type = (types - {'bytearray'}).pop()
+    elif types <= set(NUMERIC):
+        type = max(types, key=_WIDTH.get)
+    else:
+        type = None
+    if type not in _WIDTH:
+        raise UnsupportedScript(
+            'arithmetic on {} and {}'.format(left.type, right.type))
+    return left.cast(type), right.cast(type)
+
+
+def _comparable(left, right):
+    """ Casts two columns to a type they can be compared in. """
+    if not isinstance(left, Column) or not isinstance(right, Column):
+        raise UnsupportedScript('comparing complex types')
+    types = {left.type, right.type}
+    if types <= {'chararray', 'bytearray'}:
+        return left.cast('chararray'), right.cast('chararray')
+    if types == {'boolean'}:
+        return left, right
+    return _numeric(left, right)
+
+
+def _arithmetic(op, left, right):
+    left, right = _numeric(left, right)
+    a, b = left.values, right.values
+    nulls = left.nulls | right.nulls
+    if op == '+':
+        values = a + b
+    elif op == '-':
+        values = a - b
+    elif op == '*':
+        values = a * b
+    else:
+        # pig yields null rather than failing on division by zero
+        zero = b == 0
+        nulls = nulls | zero
+        b = np.where(zero, 1, b).astype(b.dtype)
+        if left.type in {'int', 'long'}:
+            # java's integer division truncates towards zero
+            quotient = a // b
+            quotient += (a % b != 0) & ((a < 0) != (b < 0))
+            values = quotient if op == '/' else a - b * quotient
+        elif op == '/':
+            values = a / b
+        else:
+            raise UnsupportedScript('% on ' + left.type)
+    return Column(wrap_int(values, left.type), nulls, left.type)
+
+
+def _compare(op, left, right):
+    left, right = _comparable(left, right)
+    values = getattr(np, _COMPARISONS[op])(
+        left.values, right.values).astype(np.bool_)
+    return Column(values, left.nulls | right.nulls, 'boolean')
+
+
+def _logical(op, left, right):
+    """ AND and OR, using pig's three valued logic for nulls. """
+    left, right = _boolean(left), _boolean(right)
+    if op == 'and':
+        decided = (~left.nulls & ~left.values) | (~right.nulls & ~right.values)
+        nulls = (left.nulls | right.nulls) & ~decided
+        values = ~decided & ~nulls
+    else:
+        decided = (~left.nulls & left.values) | (~right.nulls & right.values)
+        nulls = (left.nulls | right.nulls) & ~decided
+        values = decided
+    return Column(values, nulls, 'boolean')
+
+
+def _deref(column, field):
+    """ Projects a field out of a tuple or bag column. """
+    if isinstance(column, TupleColumn):
+        if isinstance(field, ast.Position):
+            return column.columns[field.index]
+        if field.name not in column.names:
+            raise UnsupportedScript('unable to resolve field ' + field.name)
+        return column.columns[column.names.index(field.name)]
+    if isinstance(column, BagColumn):
+        relation = column.relation
+        index = field.index if isinstance(field, ast.Position) \
+            else relation.index(field.name)
+        projected = Relation(
+            [relation.fields[index]], [relation.columns[index]], len(relation))
+        return BagColumn(projected, column.order, column.sizes)
+    raise UnsupportedScript('projecting a field out of a ' + column.type)
+
+
+def _aggregate(name, args, relation):
+    """ Evaluates the builtin aggregate functions over bags. """
+    if len(args) != 1:
+        raise UnsupportedScript('function ' + name)
+    bags = evaluate(args[0], relation)
+    if not isinstance(bags, BagColumn):
+        raise UnsupportedScript('function {} on a {}'.format(name, bags.type))
+    none = np.zeros(len(bags), dtype=np.bool_)
+
+    if name == 'COUNT_STAR':
+        return Column(bags.sizes.astype(np.int64), none, 'long')
+    if len(bags.relation.columns) != 1 and name != 'COUNT':
+        raise UnsupportedScript('{} of a bag with several fields'.format(name))
+    column = bags.relation.columns[0]
+    if name == 'COUNT':
+        present = Column(
+            np.zeros(len(column), dtype=np.int64), column.nulls, 'long')
+        return Column(bags.reduce(np.add, present, 0)[1], none, 'long')
+
+    if not isinstance(column, Column):
+        raise UnsupportedScript('{} of a {}'.format(name, column.type))
+    if column.type == 'bytearray':
+        column = column.cast('double')
+    if column.type not in NUMERIC:
+        raise UnsupportedScript('{} of {}'.format(name, column.type))
+
+    if name in {'SUM', 'AVG'}:
+        type = 'long' if column.type in {'int', 'long'} else 'double'
+        if name == 'AVG':
+            type = 'double'
+        total, counts = bags.reduce(np.add, column.cast(type), 0)
+        if name == 'AVG':
+            total = total / np.maximum(counts, 1)
+        return Column(total, counts == 0, type)
+    if name in {'MIN', 'MAX'}:
+        # the identity of each reduction stands in for nulls
+        if column.values.dtype == np.int64:
+            info = np.iinfo(np.int64)
+            lowest, highest = info.min, info.max
+        else:
+            lowest, highest = -np.inf, np.inf
+        ufunc, fill = (np.minimum, highest) if name == 'MIN' \
+            else (np.maximum, lowest)
+        result, counts = bags.reduce(ufunc, column, fill)
+        return Column(result, counts == 0, column.type)
+    raise UnsupportedScript('function ' + name)
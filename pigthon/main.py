@@ -3,13 +3,17 @@
 
 from genericpath import exists
 from os import environ, name
+from pigthon.explain import ExplainPlan
+from pigthon.latin.parser import UnsupportedScript
 from pigthon.util import cmd
 from pigthon.util.processreader import ProcessReader
 from pigthon.util.ptlog import PtLog
 from pigthon.util.yaml_conf import load_yaml
 from subprocess import Popen, PIPE
+import copy
 import os
 import sys
+import time
 
 
 logger = PtLog(__name__)
@@ -18,6 +22,44 @@ logger = PtLog(__name__)
 ON_POSIX = 'posix' in sys.builtin_module_names
 
 
+# execution engines pig can run a script with
+EXECTYPES = {'local', 'mapreduce', 'tez', 'tez_local', 'spark', 'spark_local'}
+
+# -D properties each execution engine needs; any dparams supplied by the
+# caller take precedence. tez reads the rest of its settings from
+# tez-site.xml on the classpath.
+ENGINE_DPARAMS = {
+    'spark': {'spark.master': 'yarn-client'},
+    'spark_local': {'spark.master': 'local'},
+}
+
+# environment variables the pig launcher reads to configure each execution
+# engine; values already set in the environment take precedence
+ENGINE_ENVIRONMENT = {
+    'spark': {'SPARK_MASTER': 'yarn-client'},
+    'spark_local': {'SPARK_MASTER': 'local'},
+}
+
+# the environment variable that sets the same thing as an engine's -D
+# property; the -D default is left out when the variable is set
+ENGINE_DPARAM_ENVIRONMENT = {
+    'spark.master': 'SPARK_MASTER',
+}
+
+# the engine each exectype is explained with; the plan is only parsed for
+# MapReduce jobs, so DAG engines are explained as the equivalent MapReduce
+# jobs
+EXPLAIN_EXECTYPES = {
+    None: 'mapreduce',
+    'mapreduce': 'mapreduce',
+    'local': 'local',
+    'tez': 'mapreduce',
+    'tez_local': 'local',
+    'spark': 'mapreduce',
+    'spark_local': 'local',
+}
+
+
 class PigOptions(object):
     """ Manages command line options for pig script execution. """
 
@@ -49,8 +91,8 @@ class PigOptions(object):
         :param verbose: print all error messages to screen
         :param warning: turn warning logging on; also turns warning aggregation
          off
-        :param exectype: set execution mode - local|mapreduce, default is
-         mapreduce
+        :param exectype: set execution mode - local|mapreduce|tez|tez_local|
+         spark|spark_local, default is mapreduce
         :param stop_on_failure: aborts execution on the first failed job;
          default is off
         :param no_multiquery: turn multiquery optimization off; default is on
@@ -77,7 +119,7 @@ class PigOptions(object):
         assert dryrun in {True, False, None}
         assert verbose in {True, False, None}
         assert warning in {True, False, None}
-        assert exectype in {'local', 'mapreduce', None}
+        assert exectype in EXECTYPES or exectype is None
         assert stop_on_failure in {True, False, None}
         assert no_multiquery in {True, False, None}
         assert type(property_file) in {str, unicode} or property_file is None
@@ -178,7 +220,7 @@ class PigOptions(object):
         return self._options.get('warning', None)
 
     def exectype(self):
-        """ Set execution mode: local|mapreduce, default is mapreduce. """
+        """ Set execution mode: see EXECTYPES, default is mapreduce. """
         return self._options.get('exectype', None)
 
     def stop_on_failure(self):
@@ -197,6 +239,33 @@ class PigOptions(object):
         """ Key value pairs to supply to pig as -D params. """
         return self._options.get('dparams', None)
 
+    def engine_dparams(self):
+        """
+        The -D params to supply to pig, including those the execution engine
+        needs that are not already set in the environment.
+        """
+        dparams = dict(
+            (key, value)
+            for key, value in ENGINE_DPARAMS.get(
+                self.exectype(), {}).iteritems()
+            if ENGINE_DPARAM_ENVIRONMENT.get(key, None) not in environ
+        )
+        if self.dparams() is not None and isinstance(self.dparams(), dict):
+            dparams.update(self.dparams())
+        return dparams if len(dparams) > 0 else None
+
+    def environment(self):
+        """
+        Environment variables the execution engine needs that are not
+        already set.
+        """
+        return dict(
+            (key, value)
+            for key, value in ENGINE_ENVIRONMENT.get(
+                self.exectype(), {}).iteritems()
+            if key not in environ
+        )
+
     def to_cmd_array(self):
         """
         Converts the options into an array of values to be passed on the
@@ -209,8 +278,8 @@ class PigOptions(object):
             return ['-version']
 
         args = []
-        if self.dparams() is not None and isinstance(self.dparams(), dict):
-            for key, value in self.dparams().iteritems():
+        if self.engine_dparams() is not None:
+            for key, value in self.engine_dparams().iteritems():
                 value = str(value)
                 if value == '':
                     args += ['-D{}=""'.format(key)]
@@ -236,7 +305,12 @@ class PigOptions(object):
             args += ['-debug', self.debug()]
 
         if self.execute() is not None:
-            args += ['-execute', cmd.safe_quote(self.execute())]
+            # pig is only run through a shell on windows; elsewhere the
+            # statements are passed to it as they are
+            execute = self.execute()
+            if name == 'nt':
+                execute = cmd.safe_quote(execute)
+            args += ['-execute', execute]
 
         if self.embedded() is not None:
             args += ['-embedded', self.embedded()]
@@ -283,10 +357,33 @@ class PigTestOptions(PigOptions):
     """ Manages command line options when running pig tests. """
 
     def __init__(self, *args, **kwargs):
+        """
+        Accepts the same arguments as PigOptions, plus:
+
+        :param sample: runs the script against samples of its local inputs
+        :type sample: pigthon.sample.Sampler or None
+        :param backend: runs the script with pig, or in-process with python
+         when it only uses the subset of pig latin that supports - pig|python,
+         default is pig
+        """
+        sample = kwargs.pop('sample', None)
+        backend = kwargs.pop('backend', None)
+        assert backend in {'pig', 'python', None}
         super(PigTestOptions, self).__init__(*args, **kwargs)
+        self._options['sample'] = sample
+        self._options['backend'] = backend
+
+    def sample(self):
+        """ Samples the script's local inputs; default is off. """
+        return self._options.get('sample', None)
+
+    def backend(self):
+        """ What runs the script: pig|python, default is pig. """
+        value = self._options.get('backend', None)
+        return value if value is not None else 'pig'
 
     def exectype(self):
-        """ Set execution mode: local|mapreduce, default is local. """
+        """ Set execution mode: see EXECTYPES, default is local. """
         value = self._options.get('exectype', None)
         return value if value is not None else 'local'
 
@@ -324,8 +421,20 @@ class PigTest(object):
 class Pigthon(object):
     """ Encapsulates the logic necessary for running pig. """
 
-    def __init__(self, filename=None, is_jar=None):
+    def __init__(self, filename=None, is_jar=None, engine_policy=None,
+                 history=None):
+        """
+        :param str filename: path to a yaml config file
+        :param bool is_jar: whether pig is run from a jar
+        :param engine_policy: chooses the exectype for scripts that do not
+         set one
+        :type engine_policy: pigthon.engine.EnginePolicy or None
+        :param history: records every run of pig
+        :type history: pigthon.history.RunHistory or None
+        """
         self._config = dict()
+        self._engine_policy = engine_policy
+        self._history = history
         if filename is not None:
             self._config = load_yaml(filename)
 
@@ -338,23 +447,29 @@ class Pigthon(object):
             if pj is not None and exists(pj):
                 self._config['is_jar'] = True
 
-    def run(self, args):
+    def run(self, args, env=None):
         """
         Runs stuff on the command line.
 
         :param list args: the arguments to run
+        :param dict env: environment variables to set in addition to the
+         current environment
         :returns: the output and error output from the command that was ran
         :rtype: tuple(output, error)
         """
         logger.info('Running command: ')
         logger.info(' '.join(args))
         is_windows = name == 'nt'
+        run_env = environ
+        if env:
+            run_env = dict(environ)
+            run_env.update(env)
         p = Popen(
             args,
             stdout=PIPE,
             stderr=PIPE,
             shell=is_windows,
-            env=environ,
+            env=run_env,
             bufsize=1,
             close_fds=ON_POSIX
         )
@@ -377,18 +492,32 @@ class Pigthon(object):
         # else:
         #     return [environ.get('PIG')]
 
-    def pig(self, options=None):
+    def pig(self, options=None, record=True):
         """
         Runs pig with the arguments supplied.
 
         :param options: all of the command line options to supply to the pig
          command
         :type options: PigOptions, PigTestOptions or None
+        :param bool record: whether to add the run to the history, if any;
+         runs that only inspect a script leave it out
         """
         if options is None:
             options = PigOptions()
+        policy = self._engine_policy
+        if policy is not None and options.exectype() is None:
+            options = copy.deepcopy(options)
+            options._options['exectype'] = policy.select(self, options)
+        else:
+            policy = None
         args = self.pig_cmd() + options.to_cmd_array()
-        code, output, error = self.run(args)
+        start = time.time()
+        code, output, error = self.run(args, options.environment())
+        duration = time.time() - start
+        if policy is not None:
+            policy.record(options, duration, code == 0)
+        if self._history is not None and record:
+            self._history.record(options, code, start, duration, output, error)
         logger.debugHeader('error')
         logger.debug(os.linesep + os.linesep.join(error))
         logger.debugHeader('output')
@@ -406,5 +535,59 @@ class Pigthon(object):
         """
         if options is None:
             options = PigTestOptions()
+        if isinstance(options, PigTestOptions) and \
+                options.sample() is not None:
+            options = options.sample().apply(options)
+        if isinstance(options, PigTestOptions) and \
+                options.backend() == 'python':
+            # imported here so numpy is only needed by the python backend
+            from pigthon.latin.runner import run_script
+            try:
+                return run_script(options)
+            except UnsupportedScript as e:
+                logger.info('Running with pig instead of python: {}'.format(e))
         code, output, error = self.pig(options)
         return code, output, error
+
+    def explain(self, options=None):
+        """
+        Runs pig's EXPLAIN on the script supplied, without executing it.
+        Scripts set to run with tez or spark are explained as MapReduce jobs.
+
+        :param options: all of the command line options to supply to the pig
+         command; file must be set to the script to explain
+        :type options: PigOptions or PigTestOptions
+        :returns: the result code, the parsed plan, and error output
+        :rtype: tuple(int, ExplainPlan, list)
+        """
+        assert options is not None and options.file() is not None, \
+            'options must supply the file to explain'
+        statement = 'explain -script {}'.format(_grunt_quote(options.file()))
+        if options.params() is not None:
+            for key, value in options.params().iteritems():
+                statement += ' -param {}'.format(
+                    _grunt_quote('{}={}'.format(key, value)))
+        if options.param_file() is not None:
+            statement += ' -param_file {}'.format(
+                _grunt_quote(options.param_file()))
+
+        explain_options = copy.deepcopy(options)
+        explain_options._options['file'] = None
+        explain_options._options['params'] = None
+        explain_options._options['param_file'] = None
+        explain_options._options['execute'] = statement
+        # explaining runs no jobs, so leave the engine policy out of it
+        explain_options._options['exectype'] = \
+            EXPLAIN_EXECTYPES[options.exectype()]
+        code, output, error = self.pig(explain_options, record=False)
+        return code, ExplainPlan.parse(output, options), error
+
+
+def _grunt_quote(value):
+    """
+    Quotes a value as a string literal for a grunt command such as explain.
+
+    :param str value: the value to quote
+    :rtype: str
+    """
+    return "'" + str(value).replace('\\', '\\\\').replace("'", "\\'") + "'"
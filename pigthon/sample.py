@@ -0,0 +1,185 @@
+""" Runs pig scripts against cached samples of their local inputs. """
+
+
+from genericpath import exists
+from pigthon.util.files import input_files, makedirs, write_script
+from pigthon.util.params import param_values, strip_comments
+from pigthon.util.ptlog import PtLog
+import copy
+import hashlib
+import os
+import random
+import re
+import tempfile
+
+
+logger = PtLog(__name__)
+
+
+_LOAD = re.compile(r"(?P<load>\bLOAD\s+)'(?P<path>[^']*)'", re.IGNORECASE)
+_PARAM = re.compile(r'\$\{?(?P<name>\w+)\}?')
+
+# extensions pig decompresses on load, which would be lost by sampling
+_COMPRESSED = ('.gz', '.bz2', '.bz', '.lzo', '.snappy')
+
+_SAMPLE_FILE = 'part-m-00000'
+
+
+class Sampler(object):
+    """
+    Builds deterministic samples of local files, reusing them until the files
+    they were taken from change.
+    """
+
+    def __init__(self, fraction=None, rows=None, seed=0, cache_dir=None):
+        """
+        :param float fraction: the fraction of lines to keep, between 0 and 1
+        :param int rows: the number of lines to keep, chosen using reservoir
+         sampling
+        :param int seed: seeds the random choice of lines
+        :param str cache_dir: where samples are written; defaults to a
+         directory under the system's temp directory
+        """
+        assert (fraction is None) != (rows is None), \
+            'exactly one of fraction or rows must be supplied'
+        if fraction is not None:
+            assert 0 < fraction <= 1, 'fraction must be in (0, 1]'
+        if rows is not None:
+            assert rows > 0, 'rows must be positive'
+        if cache_dir is None:
+            cache_dir = os.path.join(tempfile.gettempdir(), 'pigthon-samples')
+        self.fraction = fraction
+        self.rows = rows
+        self.seed = seed
+        self.cache_dir = cache_dir
+
+    def sample(self, path):
+        """
+        Gets a sample of the file or directory supplied, building it if it
+        does not already exist.
+
+        :param str path: the local file or directory to sample
+        :returns: the path to the sample, or None if it cannot be sampled
+        :rtype: str or None
+        """
+        files = input_files(path)
+        if len(files) == 0:
+            return None
+        if any(f.endswith(_COMPRESSED) for f in files):
+            logger.info('Not sampling compressed input {}'.format(path))
+            return None
+
+        key = self._key(path, files)
+        target = os.path.join(self.cache_dir, key)
+        if os.path.isfile(path):
+            target = os.path.join(target, os.path.basename(path))
+        else:
+            target = os.path.join(target, _SAMPLE_FILE)
+        if exists(target):
+            logger.debug('Reusing sample {} of {}'.format(target, path))
+        else:
+            logger.info('Sampling {} into {}'.format(path, target))
+            self._write(files, target)
+        return os.path.dirname(target) if os.path.isdir(path) else target
+
+    def rewrite(self, script, params=None):
+        """
+        Points the LOAD statements in a script at samples of their inputs.
+        Inputs that are not local files or directories are left alone.
+
+        :param str script: the text of the pig script
+        :param dict params: values for parameters used in LOAD paths, which
+         override the script's %default directives
+        :rtype: str
+        """
+        values = param_values(strip_comments(script), params)
+
+        def _substitute(match):
+            return values.get(match.group('name'), match.group(0))
+
+        def _replace(match):
+            path = _PARAM.sub(_substitute, match.group('path'))
+            sample = None
+            if '$' in path:
+                logger.info('Not sampling {}, its parameters are '
+                            'undefined'.format(path))
+            elif exists(path):
+                sample = self.sample(path)
+            if sample is None:
+                return match.group(0)
+            return "{}'{}'".format(match.group('load'), sample)
+
+        return _LOAD.sub(_replace, script)
+
+    def apply(self, options):
+        """
+        Copies the options, pointing them at a sampled version of the script.
+
+        :param options: the options naming the script to sample
+        :type options: PigOptions or PigTestOptions
+        :rtype: PigOptions or PigTestOptions
+        """
+        assert options.file() is not None, \
+            'options must supply the file to sample'
+        with open(options.file(), 'r') as f:
+            script = self.rewrite(f.read(), options.params())
+
+        sampled = copy.deepcopy(options)
+        sampled._options['file'] = write_script(
+            os.path.join(self.cache_dir, 'scripts'), script)
+        return sampled
+
+    def _key(self, path, files):
+        """ Identifies a sample by its settings and the state of its input. """
+        digest = hashlib.sha1()
+        digest.update(repr((
+            os.path.abspath(path), self.fraction, self.rows, self.seed
+        )))
+        for name in files:
+            stat = os.stat(name)
+            digest.update(repr((name, stat.st_size, stat.st_mtime)))
+        return digest.hexdigest()
+
+    def _write(self, files, target):
+        """ Samples the lines of the files into target. """
+        rng = random.Random(self.seed)
+        if self.rows is not None:
+            lines = _reservoir(_read_lines(files), self.rows, rng)
+        else:
+            lines = (
+                line for line in _read_lines(files)
+                if rng.random() < self.fraction
+            )
+
+        # write to a temporary file first so an interrupted sample is never
+        # mistaken for a complete one
+        makedirs(os.path.dirname(target))
+        partial = target + '.partial'
+        with open(partial, 'wb') as f:
+            for line in lines:
+                f.write(line)
+        os.rename(partial, target)
+
+
+def _read_lines(files):
+    """ Yields every line of the files, in order. """
+    for name in files:
+        with open(name, 'rb') as f:
+            for line in f:
+                if not line.endswith('\n'):
+                    line += '\n'
+                yield line
+
+
+def _reservoir(lines, size, rng):
+    """ Chooses size lines uniformly at random, preserving their order. """
+    reservoir = []
+    for i, line in enumerate(lines):
+        if i < size:
+            reservoir.append((i, line))
+        else:
+            j = rng.randint(0, i)
+            if j < size:
+                reservoir[j] = (i, line)
+    return [line for i, line in sorted(reservoir)]
+
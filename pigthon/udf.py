@@ -0,0 +1,359 @@
+"""
+Hosts python functions that pig scripts call through STREAM.
+
+Pig's streaming protocol is line oriented text (PigStreaming), so rather than
+calling a function per record the host reads records in batches, decodes
+each batch into columns, makes a single call per batch, and writes the
+batch's output in one go.
+
+A module defining functions registers them with a host and serves them when
+run as a script::
+
+    host = UdfHost()
+
+    @host.register(input='x:double, y:double', output='distance:double')
+    def distance(x, y):
+        return [math.hypot(a, b) for a, b in zip(x, y)]
+
+    if __name__ == '__main__':
+        host.main()
+
+The nodes running the script need pigthon installed.
+"""
+
+
+from pigthon.util.files import write_script
+from StringIO import StringIO
+import copy
+import inspect
+import itertools
+import os
+import sys
+import tempfile
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+_INTEGERS = {'int', 'long'}
+_FLOATS = {'float', 'double'}
+
+
+def parse_schema(schema):
+    """
+    Parses a flat pig schema such as 'a:int, b:chararray'. Fields without a
+    type are bytearrays.
+
+    :param str schema: the schema
+    :returns: (name, type) pairs
+    :rtype: list
+    """
+    fields = []
+    for field in schema.strip().strip('()').split(','):
+        name, _, type = field.partition(':')
+        fields.append((name.strip(), type.strip().lower() or 'bytearray'))
+    return fields
+
+
+class Udf(object):
+    """ A function registered with a UdfHost. """
+
+    def __init__(self, name, func, input, output, vectorized, arrays):
+        """
+        :param str name: the name the function is defined as in pig
+        :param func: the function
+        :param str input: the schema of the records streamed in, or None to
+         receive every field as a string, None where empty
+        :param str output: the schema of the records the function returns
+        :param bool vectorized: whether the function is called once per batch
+         with a column per field, rather than once per record
+        :param bool arrays: whether numeric columns are passed as numpy
+         arrays
+        """
+        self.name = name
+        self.func = func
+        self.input = parse_schema(input) if input is not None else None
+        self.output = parse_schema(output)
+        self.vectorized = vectorized
+        self.arrays = arrays
+
+    def script(self):
+        """ The path to the module defining the function. """
+        return os.path.abspath(inspect.getsourcefile(self.func))
+
+    def call(self, rows):
+        """
+        Runs the function over a batch of records.
+
+        :param list rows: the decoded records
+        :returns: the output records
+        :rtype: list
+        :raises ValueError: if the function's output doesn't match the batch
+         or the output schema
+        """
+        if not self.vectorized:
+            return [self._row(self.func(*row)) for row in rows]
+
+        width = len(self.input) if self.input is not None else \
+            max(len(row) for row in rows)
+        columns = [
+            self._column([row[i] if i < len(row) else None for row in rows], i)
+            for i in range(width)
+        ]
+        result = self.func(*columns)
+        if len(self.output) == 1:
+            result = [result]
+        result = [_to_list(column) for column in result]
+        if len(result) != len(self.output):
+            raise ValueError('{} returned {} columns, expected {}'.format(
+                self.name, len(result), len(self.output)))
+        for column in result:
+            if len(column) != len(rows):
+                raise ValueError(
+                    '{} returned {} rows for a batch of {}'.format(
+                        self.name, len(column), len(rows)))
+        return zip(*result)
+
+    def _column(self, values, index):
+        """ Converts a decoded column into the form the function takes. """
+        if not self.arrays or np is None or self.input is None:
+            return values
+        type = self.input[index][1]
+        if type in _FLOATS or (type in _INTEGERS and None in values):
+            return np.array(
+                [np.nan if v is None else v for v in values],
+                dtype=np.float64
+            )
+        if type in _INTEGERS:
+            return np.array(values, dtype=np.int64)
+        return values
+
+    def _row(self, value):
+        """ Normalizes a single output record to a tuple. """
+        if len(self.output) == 1:
+            return (value,)
+        value = tuple(value)
+        if len(value) != len(self.output):
+            raise ValueError('{} returned {} fields, expected {}'.format(
+                self.name, len(value), len(self.output)))
+        return value
+
+
+class UdfHost(object):
+    """ Registers python functions and serves them to pig's STREAM. """
+
+    def __init__(self, batch_size=4096, python='python', ship=True,
+                 script_dir=None):
+        """
+        :param int batch_size: the number of records passed per call
+        :param str python: the interpreter pig runs the host with
+        :param bool ship: whether to SHIP the module to the cluster; local
+         runs can leave it where it is
+        :param str script_dir: where scripts with the DEFINE statements
+         added are written; defaults to a directory under the system's temp
+         directory
+        """
+        if script_dir is None:
+            script_dir = os.path.join(tempfile.gettempdir(), 'pigthon-udfs')
+        self.batch_size = batch_size
+        self.python = python
+        self.ship = ship
+        self.script_dir = script_dir
+        self._udfs = dict()
+
+    def register(self, name=None, input=None, output='value:chararray',
+                 vectorized=True, arrays=False):
+        """
+        Decorator registering a function. See Udf for the arguments; name
+        defaults to the function's name.
+        """
+        def _register(func):
+            udf = Udf(name or func.__name__, func, input, output, vectorized,
+                      arrays)
+            self._udfs[udf.name] = udf
+            return func
+        return _register
+
+    def udf(self, name):
+        """ The function registered under a name. """
+        assert name in self._udfs, 'no udf named {}'.format(name)
+        return self._udfs[name]
+
+    def define(self, name):
+        """
+        The DEFINE statement making a function available to STREAM.
+
+        :param str name: the registered name of the function
+        :rtype: str
+        """
+        udf = self.udf(name)
+        script = udf.script()
+        command = '{} {} {} {}'.format(
+            self.python,
+            os.path.basename(script) if self.ship else script,
+            name,
+            self.batch_size
+        )
+        statement = 'DEFINE {} `{}`'.format(name, command)
+        if self.ship:
+            statement += " SHIP('{}')".format(script)
+        return statement + ';'
+
+    def defines(self):
+        """ The DEFINE statements for every registered function. """
+        return '\n'.join(self.define(name) for name in sorted(self._udfs))
+
+    def stream(self, alias, name):
+        """
+        A STREAM expression sending a relation through a function, e.g.
+        'B = ' + host.stream('A', 'distance') + ';'.
+
+        :param str alias: the relation to stream
+        :param str name: the registered name of the function
+        :rtype: str
+        """
+        udf = self.udf(name)
+        return 'STREAM {} THROUGH {} AS ({})'.format(
+            alias,
+            name,
+            ', '.join('{}:{}'.format(n, t) for n, t in udf.output)
+        )
+
+    def apply(self, options):
+        """
+        Copies the options, pointing them at a version of the script with the
+        DEFINE statements for every registered function added to the top.
+
+        :param options: the options naming the script
+        :type options: PigOptions or PigTestOptions
+        :rtype: PigOptions or PigTestOptions
+        """
+        assert options.file() is not None, \
+            'options must supply the file to add the udfs to'
+        with open(options.file(), 'r') as f:
+            script = self.defines() + '\n' + f.read()
+
+        applied = copy.deepcopy(options)
+        applied._options['file'] = write_script(self.script_dir, script)
+        return applied
+
+    def serve(self, name, stdin=None, stdout=None, batch_size=None):
+        """
+        Streams records from pig through a function until stdin closes.
+
+        :param str name: the registered name of the function
+        :param stdin: where pig writes records
+        :param stdout: where pig reads the function's output
+        :param int batch_size: overrides the host's batch size
+        """
+        udf = self.udf(name)
+        stdin = stdin if stdin is not None else sys.stdin
+        stdout = stdout if stdout is not None else sys.stdout
+        batch_size = batch_size or self.batch_size
+        lines = iter(stdin.readline, '')
+        while True:
+            batch = list(itertools.islice(lines, batch_size))
+            if len(batch) == 0:
+                break
+            rows = [decode(line, udf.input) for line in batch]
+            stdout.write(''.join(encode(row) for row in udf.call(rows)))
+            stdout.flush()
+
+    def main(self, argv=None):
+        """
+        Serves the function named on the command line, as invoked by the
+        commands DEFINE generates.
+
+        :param list argv: the command line, defaults to sys.argv
+        """
+        argv = argv if argv is not None else sys.argv
+        batch_size = int(argv[2]) if len(argv) > 2 else None
+        self.serve(argv[1], batch_size=batch_size)
+
+
+class FakeStreamDriver(object):
+    """
+    Stands in for pig when testing functions, sending records through a
+    host's serve loop the way pig's STREAM would.
+    """
+
+    def __init__(self, host):
+        """
+        :param UdfHost host: the host to drive
+        """
+        self.host = host
+
+    def run(self, name, rows, batch_size=None):
+        """
+        Streams records through a function.
+
+        :param str name: the registered name of the function
+        :param list rows: the input records, as tuples
+        :param int batch_size: overrides the host's batch size
+        :returns: the output records, typed by the function's output schema
+        :rtype: list
+        """
+        stdin = StringIO(''.join(encode(row) for row in rows))
+        stdout = StringIO()
+        self.host.serve(name, stdin, stdout, batch_size)
+        output = self.host.udf(name).output
+        return [decode(line, output) for line in stdout.getvalue()
+                .splitlines(True)]
+
+
+def encode(row):
+    """ Serializes a record as PigStreaming does: tab separated fields. """
+    return '\t'.join(_encode_value(value) for value in row) + '\n'
+
+
+def decode(line, schema=None):
+    """
+    Deserializes a record written by PigStreaming, typing its fields by the
+    schema supplied. Empty fields are null.
+
+    :param str line: the record
+    :param list schema: (name, type) pairs from parse_schema
+    :rtype: tuple
+    """
+    fields = line.rstrip('\n').split('\t')
+    if schema is None:
+        return tuple(None if value == '' else value for value in fields)
+    values = []
+    for i, (name, type) in enumerate(schema):
+        value = fields[i] if i < len(fields) else ''
+        values.append(_decode_value(value, type))
+    return tuple(values)
+
+
+def _encode_value(value):
+    if value is None or (isinstance(value, float) and value != value):
+        return ''
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+def _decode_value(value, type):
+    if value == '':
+        return None
+    try:
+        if type in _INTEGERS:
+            return int(value)
+        if type in _FLOATS:
+            return float(value)
+    except ValueError:
+        return None
+    if type == 'boolean':
+        return value.lower() == 'true'
+    return value
+
+
+def _to_list(column):
+    """ Converts numpy output to plain python values. """
+    if np is not None and isinstance(column, np.ndarray):
+        return column.tolist()
+    return list(column)
@@ -0,0 +1,54 @@
+""" File system utilities. """
+
+
+import hashlib
+import os
+
+
+def input_files(path):
+    """
+    Lists the files pig would read for a path, skipping hidden and _ prefixed
+    files such as _SUCCESS.
+
+    :param str path: a file or directory
+    :return: absolute paths of the files, in sorted order
+    :rtype: list
+    """
+    if os.path.isfile(path):
+        return [os.path.abspath(path)]
+    files = []
+    for root, dirs, names in os.walk(path):
+        dirs[:] = sorted(d for d in dirs if not d.startswith(('.', '_')))
+        for name in sorted(names):
+            if not name.startswith(('.', '_')):
+                files.append(os.path.abspath(os.path.join(root, name)))
+    return files
+
+
+def makedirs(path):
+    """
+    Creates a directory and its parents if they do not exist.
+
+    :param str path: the directory to create
+    """
+    if not os.path.isdir(path):
+        os.makedirs(path)
+
+
+def write_script(directory, script):
+    """
+    Writes a generated pig script, named after its content so that identical
+    scripts are only written once.
+
+    :param str directory: where to write the script
+    :param str script: the text of the script
+    :return: the path to the script
+    :rtype: str
+    """
+    path = os.path.join(
+        directory, hashlib.sha1(script).hexdigest() + '.pig')
+    if not os.path.exists(path):
+        makedirs(directory)
+        with open(path, 'w') as f:
+            f.write(script)
+    return path
@@ -0,0 +1,63 @@
+""" Pig Latin preprocessing shared by the tools that rewrite scripts. """
+
+
+import re
+
+
+_DIRECTIVE = re.compile(
+    r'^\s*%(?P<kind>default|declare)\s+(?P<name>\w+)\s+'
+    r'(?P<value>.*?)\s*;?\s*$',
+    re.IGNORECASE | re.MULTILINE
+)
+
+
+def strip_comments(text):
+    """ Removes -- and /* */ comments outside of string literals. """
+    out = []
+    i = 0
+    while i < len(text):
+        c = text[i]
+        if c == '\'':
+            end = i + 1
+            while end < len(text) and text[end] != '\'':
+                end += 2 if text[end] == '\\' else 1
+            out.append(text[i:end + 1])
+            i = end + 1
+        elif text.startswith('--', i):
+            end = text.find('\n', i)
+            i = len(text) if end < 0 else end
+        elif text.startswith('/*', i):
+            end = text.find('*/', i + 2)
+            i = len(text) if end < 0 else end + 2
+        else:
+            out.append(c)
+            i += 1
+    return ''.join(out)
+
+
+def param_values(text, params=None):
+    """
+    The value of every parameter a script's %default and %declare
+    directives and the parameters supplied define.
+
+    :param str text: the script
+    :param dict params: values supplied on the command line, which override
+     %default
+    :rtype: dict
+    """
+    values = dict()
+    for match in _DIRECTIVE.finditer(text):
+        value = match.group('value')
+        if len(value) > 1 and value[0] == value[-1] and value[0] in '\'"':
+            value = value[1:-1]
+        if match.group('kind').lower() == 'declare' or \
+                match.group('name') not in values:
+            values[match.group('name')] = value
+    if params is not None:
+        values.update((k, str(v)) for k, v in params.iteritems())
+    return values
+
+
+def strip_directives(text):
+    """ Removes %default and %declare directives. """
+    return _DIRECTIVE.sub('', text)
@@ -0,0 +1,139 @@
+""" Unit tests for engine. """
+
+
+from pigthon.engine import HistoryEnginePolicy, PlanEnginePolicy
+from pigthon.explain import ExplainPlan, MapReduceJob
+from pigthon.history import RunHistory
+from pigthon.main import PigOptions, Pigthon
+from test.test_base import TestBase
+import os
+import shutil
+import tempfile
+import time
+
+
+class FakePigthon(object):
+    """ Stands in for Pigthon, explaining every script with a fixed plan. """
+
+    def __init__(self, job_count, code=0):
+        self.code = code
+        self.plan = ExplainPlan(
+            jobs=[MapReduceJob('scope-{}'.format(i)) for i in range(job_count)]
+        )
+        self.explained = []
+
+    def explain(self, options):
+        self.explained.append(options)
+        return self.code, self.plan, []
+
+
+class Test(TestBase):
+    """ Test cases for the engine policies. """
+
+    def test_history_tries_each_candidate(self):
+        """ Tests that unmeasured engines are tried first. """
+        policy = HistoryEnginePolicy(candidates=('mapreduce', 'tez'))
+        options = PigOptions(file='a.pig')
+        self.assertEqual('mapreduce', policy.select(None, options))
+        policy.record(PigOptions(file='a.pig', exectype='mapreduce'), 10.0)
+        self.assertEqual('tez', policy.select(None, options))
+
+    def test_history_picks_fastest(self):
+        """ Tests that the fastest engine on average is picked. """
+        policy = HistoryEnginePolicy(candidates=('mapreduce', 'tez'))
+        policy.record(PigOptions(file='a.pig', exectype='mapreduce'), 10.0)
+        policy.record(PigOptions(file='a.pig', exectype='tez'), 4.0)
+        policy.record(PigOptions(file='a.pig', exectype='tez'), 8.0)
+        policy.record(PigOptions(file='b.pig', exectype='tez'), 20.0)
+        self.assertEqual('tez', policy.select(None, PigOptions(file='a.pig')))
+        self.assertEqual(
+            'mapreduce',
+            policy.select(None, PigOptions(file='b.pig'))
+        )
+
+    def test_history_skips_failing_engine(self):
+        """ Tests that an engine a script fails on is not picked again. """
+        policy = HistoryEnginePolicy(candidates=('mapreduce', 'tez'))
+        pigthon = Pigthon(engine_policy=policy)
+        selected = []
+
+        def run(args, env=None):
+            exectype = args[args.index('-exectype') + 1]
+            selected.append(exectype)
+            return (1 if exectype == 'tez' else 0), [], []
+
+        pigthon.run = run
+        for _ in range(4):
+            pigthon.pig(PigOptions(file='a.pig'))
+        self.assertEqual(
+            ['mapreduce', 'tez', 'mapreduce', 'mapreduce'], selected)
+
+    def test_history_retries_failed_engine(self):
+        """ Tests that a failure only rules an engine out for a while. """
+        policy = HistoryEnginePolicy(retry_after=0)
+        policy.record(PigOptions(file='a.pig', exectype='mapreduce'), 10.0)
+        policy.record(PigOptions(file='a.pig', exectype='tez'), 1.0, False)
+        self.assertEqual('tez', policy.select(None, PigOptions(file='a.pig')))
+
+    def test_history_from_run_history(self):
+        """ Tests choosing engines from the runs a RunHistory recorded. """
+        directory = tempfile.mkdtemp()
+        script = os.path.join(directory, 'a.pig')
+        with open(script, 'w') as f:
+            f.write("A = LOAD 'x';\n")
+        history = RunHistory(os.path.join(directory, 'history.db'))
+        try:
+            policy = HistoryEnginePolicy(history=history)
+            options = PigOptions(file=script)
+            self.assertEqual('mapreduce', policy.select(None, options))
+            now = time.time()
+            history.record(PigOptions(file=script), 0, now - 30, 10.0)
+            history.record(
+                PigOptions(file=script, exectype='tez'), 1, now - 20, 1.0)
+            self.assertEqual('mapreduce', policy.select(None, options))
+
+            # a later success on tez clears the failure
+            history.record(
+                PigOptions(file=script, exectype='tez'), 0, now - 10, 4.0)
+            self.assertEqual('tez', policy.select(None, options))
+            self.assertEqual(
+                ({'mapreduce': [10.0], 'tez': [4.0]}, {}),
+                policy.measurements(options)
+            )
+        finally:
+            history.close()
+            shutil.rmtree(directory)
+
+    def test_history_window(self):
+        """ Tests that only the most recent runs are kept. """
+        policy = HistoryEnginePolicy(window=2)
+        for seconds in [1.0, 2.0, 3.0]:
+            policy.record(PigOptions(file='a.pig', exectype='tez'), seconds)
+        self.assertEqual([2.0, 3.0], policy.durations('a.pig', 'tez'))
+
+    def test_plan_multi_job(self):
+        """ Tests that scripts with several jobs use the DAG engine. """
+        pigthon = FakePigthon(3)
+        policy = PlanEnginePolicy()
+        options = PigOptions(file='a.pig')
+        self.assertEqual('tez', policy.select(pigthon, options))
+        self.assertEqual('tez', policy.select(pigthon, options))
+        self.assertEqual(1, len(pigthon.explained))
+        self.assertEqual('local', pigthon.explained[0].exectype())
+        self.assertEqual(None, options.exectype())
+
+    def test_plan_single_job(self):
+        """ Tests that single job scripts keep the default engine. """
+        policy = PlanEnginePolicy()
+        self.assertEqual(
+            'mapreduce',
+            policy.select(FakePigthon(1), PigOptions(file='a.pig'))
+        )
+
+    def test_plan_explain_failure(self):
+        """ Tests falling back to the default when explaining fails. """
+        policy = PlanEnginePolicy()
+        self.assertEqual(
+            'mapreduce',
+            policy.select(FakePigthon(3, code=1), PigOptions(file='a.pig'))
+        )
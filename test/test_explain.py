@@ -0,0 +1,54 @@
+""" Unit tests for explain. """
+
+
+from os.path import abspath, normpath, dirname
+from pigthon.explain import ExplainPlan
+from pigthon.main import PigOptions
+from test.test_base import TestBase
+
+
+class Test(TestBase):
+    """ Test cases for ExplainPlan. """
+
+    def plan(self, options=None):
+        """ Parses the sample MapReduce plan. """
+        path = normpath(
+            dirname(abspath(__file__)) + '/data/explain_mapreduce.txt'
+        )
+        with open(path, 'r') as f:
+            lines = f.read().splitlines()
+        return ExplainPlan.parse(lines, options)
+
+    def test_job_count(self):
+        """ Tests counting the MapReduce jobs in a plan. """
+        plan = self.plan()
+        self.assertEqual(2, plan.job_count())
+        self.assertEqual(2, plan.shuffle_count())
+        self.assertEqual(
+            ['scope-21', 'scope-24'],
+            [j.scope for j in plan.jobs]
+        )
+
+    def test_plans_split(self):
+        """ Tests that trailing separators end each map/reduce plan. """
+        job = self.plan().jobs[0]
+        self.assertTrue(job.map_plan()[-1].endswith('scope-2'))
+        self.assertEqual([], job.combine_plan())
+        self.assertEqual(3, len(job.reduce_plan()))
+        self.assertFalse(job.global_sort)
+
+    def test_replicated_join_candidates(self):
+        """ Tests finding hash joins in the logical plan. """
+        self.assertEqual(['C'], self.plan().replicated_join_candidates())
+
+    def test_missing_combiners(self):
+        """ Tests finding reduce side aggregation without a combiner. """
+        self.assertEqual(['scope-24'], self.plan().missing_combiners())
+
+    def test_warnings_no_multiquery(self):
+        """ Tests that turning multiquery off is reported. """
+        plan = self.plan(PigOptions(no_multiquery=True))
+        report = plan.report()
+        self.assertEqual(2, report['jobs'])
+        self.assertEqual(3, len(report['warnings']))
+        self.assertTrue('no_multiquery' in report['warnings'][0])
@@ -0,0 +1,162 @@
+""" Unit tests for history. """
+
+
+from pigthon.history import RunHistory, main, normalize_options, \
+    parse_counters
+from pigthon.main import PigOptions, Pigthon
+from test.test_base import TestBase
+import os
+import shutil
+import tempfile
+
+
+PIG_STATS = [
+    'Input(s):',
+    'Successfully read 1000 records (52000 bytes) from: "/data/in"',
+    'Output(s):',
+    'Successfully stored 40 records (800 bytes) in: "/data/out"',
+    'Successfully stored 2 records (20 bytes) in: "/data/other"',
+    'Counters:',
+    'Total records written : 42',
+    'Total bytes written : 820',
+    'Spillable Memory Manager spill count : 0',
+    'Job DAG:',
+    'job_201401010000_0001  ->  job_201401010000_0002,',
+    'job_201401010000_0002',
+]
+
+
+class Test(TestBase):
+    """ Test cases for RunHistory. """
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.script = os.path.join(self.dir, 'script.pig')
+        with open(self.script, 'w') as f:
+            f.write("A = LOAD 'x';\n")
+        self.history = RunHistory(os.path.join(self.dir, 'history.db'))
+
+    def tearDown(self):
+        self.history.close()
+        shutil.rmtree(self.dir)
+
+    def record(self, duration, started, written=42, code=0, exectype=None,
+               params=None):
+        """ Records a run of the test script. """
+        self.history.record(
+            PigOptions(file=self.script, exectype=exectype, params=params),
+            code,
+            started,
+            duration,
+            error=['Total records written : {}'.format(written)]
+        )
+
+    def test_parse_counters(self):
+        """ Tests reading the job statistics pig logs. """
+        self.assertEqual({
+            'records_read': 1000,
+            'bytes_read': 52000,
+            'records_written': 42,
+            'bytes_written': 820,
+            'spill_count': 0,
+            'jobs': 2,
+        }, parse_counters(PIG_STATS))
+
+    def test_normalize_options(self):
+        """ Tests that equivalent options normalize identically. """
+        first = PigOptions(file='a.pig', params={'a': 1, 'b': 2},
+                           exectype='tez')
+        second = PigOptions(file='b.pig', params={'b': 2, 'a': 1},
+                            exectype='tez')
+        self.assertEqual(
+            ['-param', 'a=1', '-param', 'b=2', '-exectype', 'tez'],
+            normalize_options(first)
+        )
+        self.assertEqual(normalize_options(first), normalize_options(second))
+
+    def test_runs(self):
+        """ Tests querying recorded runs. """
+        self.record(10.0, started=1)
+        self.record(12.0, started=2, code=1)
+        runs = self.history.runs()
+        self.assertEqual(2, len(runs))
+        self.assertEqual(12.0, runs[0]['duration'])
+        self.assertEqual(self.script, runs[0]['script'])
+        self.assertEqual({'records_written': 42}, runs[1]['counters'])
+        self.assertEqual(1, len(self.history.runs(successful=True)))
+        self.assertEqual(
+            2, len(self.history.runs(script_hash=runs[0]['script_hash'])))
+
+    def test_pigthon_records(self):
+        """ Tests that pig runs are recorded, but explaining isn't. """
+        pigthon = Pigthon(history=self.history)
+        pigthon.run = lambda args, env=None: (0, [], [])
+        pigthon.pig(PigOptions(file=self.script))
+        pigthon.explain(PigOptions(file=self.script))
+        runs = self.history.runs()
+        self.assertEqual(1, len(runs))
+        self.assertEqual(self.script, runs[0]['script'])
+
+    def test_regressions(self):
+        """ Tests flagging a run that deviates from its baseline. """
+        for i, duration in enumerate([10.0, 11.0, 9.0, 10.5, 9.5]):
+            self.record(duration, started=i)
+        self.assertEqual([], self.history.regressions())
+
+        self.record(40.0, started=10)
+        flagged = self.history.regressions()
+        self.assertEqual(['duration'], [r['metric'] for r in flagged])
+        self.assertEqual(40.0, flagged[0]['value'])
+        self.assertTrue(flagged[0]['z'] > 3)
+
+    def test_regressions_by_options(self):
+        """ Tests that runs with different options have separate baselines. """
+        for i in range(6):
+            self.record(10.0 + i % 2, started=i, exectype='mapreduce')
+        self.record(4.0, started=10, exectype='tez')
+        self.assertEqual([], self.history.regressions())
+
+        self.record(40.0, started=11, exectype='mapreduce')
+        flagged = self.history.regressions()
+        self.assertEqual(1, len(flagged))
+        self.assertEqual(['-exectype', 'mapreduce'], flagged[0]['options'])
+        self.assertEqual(
+            1, len(self.history.runs(options=['-exectype', 'tez'])))
+
+    def test_regressions_across_params(self):
+        """ Tests that param values share a baseline unless named. """
+        for day in range(10):
+            self.record(10.0 + day % 2, started=day,
+                        params={'date': '2014-01-{:02}'.format(day + 1)})
+        self.record(400.0, started=20, params={'date': '2014-01-20'})
+        flagged = self.history.regressions()
+        self.assertEqual(['duration'], [r['metric'] for r in flagged])
+        self.assertEqual([], flagged[0]['options'])
+        self.assertEqual([], self.history.regressions(params=['date']))
+
+    def test_regressions_too_few_runs(self):
+        """ Tests that scripts without enough history are not flagged. """
+        self.record(10.0, started=1)
+        self.record(100.0, started=2)
+        self.assertEqual([], self.history.regressions())
+
+    def test_main(self):
+        """ Tests the command line interface's exit code. """
+        path = os.path.join(self.dir, 'history.db')
+        for i in range(5):
+            self.record(10.0 + i % 2, started=i)
+        self.history.flush()
+        self.assertEqual(0, main([path]))
+        self.record(10.5, written=4200, started=10)
+        self.history.flush()
+        self.assertEqual(1, main([path, '--threshold', '2']))
+
+    def test_main_min_runs(self):
+        """ Tests that a baseline of a single run is rejected. """
+        path = os.path.join(self.dir, 'history.db')
+        for i in range(3):
+            self.record(10.0, started=i)
+        self.history.flush()
+        self.assertRaises(SystemExit, main, [path, '--min-runs', '1'])
+        self.assertRaises(AssertionError, self.history.regressions,
+                          min_runs=1)
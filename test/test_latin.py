@@ -0,0 +1,242 @@
+""" Unit tests for the in-process pig latin runner. """
+
+
+from pigthon.latin.columns import format_double
+from pigthon.latin.parser import UnsupportedScript, parse
+from pigthon.latin.runner import run_script
+from pigthon.main import Pigthon, PigTestOptions
+from test.test_base import TestBase
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+
+class Test(TestBase):
+    """ Test cases for the in-process runner. """
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.write('users.txt', [
+            'alice\t30\tnyc',
+            'bob\t25\tsf',
+            'carol\t\tnyc',
+            'dave\t41\tsf',
+            'erin\t30\tla',
+        ])
+        self.write('cities.txt', [
+            'nyc,New York',
+            'sf,San Francisco',
+            'sea,Seattle',
+        ])
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def path(self, name):
+        """ The path to a file in the test's directory. """
+        return os.path.join(self.dir, name)
+
+    def write(self, name, lines):
+        """ Writes lines to a file in the test's directory. """
+        with open(self.path(name), 'w') as f:
+            f.write(''.join(line + '\n' for line in lines))
+
+    def run_pig(self, script):
+        """ Runs a script in-process, returning its DUMP output. """
+        self.write('script.pig', [script])
+        code, output, error = run_script(PigTestOptions(
+            file=self.path('script.pig'),
+            params={'dir': self.dir}
+        ))
+        self.assertEqual(0, code)
+        return output
+
+    def test_filter_foreach(self):
+        """ Tests filtering and projecting with typed fields. """
+        output = self.run_pig("""
+            users = LOAD '$dir/users.txt' AS (name:chararray, age:int,
+                                              city:chararray);
+            old = FILTER users BY age >= 30 AND city != 'la';
+            out = FOREACH old GENERATE name, age * 2 AS double_age,
+                                       age / 7, (double)age / 4;
+            DUMP out;
+        """)
+        self.assertEqual(['(alice,60,4,7.5)', '(dave,82,5,10.25)'], output)
+
+    def test_nulls(self):
+        """ Tests null handling in filters and bincond. """
+        output = self.run_pig("""
+            users = LOAD '$dir/users.txt' AS (name, age:int, city);
+            unknown = FILTER users BY age IS NULL OR age < 26;
+            out = FOREACH unknown GENERATE name, (age IS NULL ? -1 : age);
+            DUMP out;
+        """)
+        self.assertEqual(['(bob,25)', '(carol,-1)'], output)
+
+    def test_empty_fields(self):
+        """ Tests that empty fields load as null. """
+        self.write('empty.txt', ['a\t\t3', '\t\t1', 'b\tx\t2'])
+        output = self.run_pig("""
+            A = LOAD '$dir/empty.txt' AS (k:chararray, m, n:int);
+            B = FILTER A BY m IS NULL;
+            G = GROUP A ALL;
+            C = FOREACH G GENERATE COUNT(A), COUNT_STAR(A);
+            D = FOREACH B GENERATE n;
+            DUMP D;
+            DUMP C;
+        """)
+        self.assertEqual(['(3)', '(1)', '(2,3)'], output)
+
+    def test_int_range(self):
+        """ Tests that ints out of range load as null and wrap in java. """
+        self.write('big.txt', [
+            '99999999999999999999', '5000000000', '2147483647', '-7'])
+        output = self.run_pig("""
+            A = LOAD '$dir/big.txt' AS (x:int);
+            B = FOREACH A GENERATE x, x + 1, (int)((double)x * 1e10),
+                                   (long)x * 2;
+            DUMP B;
+        """)
+        self.assertEqual([
+            '(,,,)',
+            '(,,,)',
+            '(2147483647,-2147483648,2147483647,4294967294)',
+            '(-7,-6,-2147483648,-14)',
+        ], output)
+
+    def test_group_aggregate(self):
+        """ Tests grouping and the algebraic builtins. """
+        output = self.run_pig("""
+            users = LOAD '$dir/users.txt' AS (name:chararray, age:int,
+                                              city:chararray);
+            by_city = GROUP users BY city;
+            out = FOREACH by_city GENERATE group, COUNT(users),
+                SUM(users.age), AVG(users.age), MAX(users.age);
+            DUMP out;
+        """)
+        self.assertEqual([
+            '(la,1,30,30.0,30)',
+            '(nyc,2,30,30.0,30)',
+            '(sf,2,66,33.0,41)',
+        ], output)
+
+    def test_group_bag_output(self):
+        """ Tests printing grouped bags and flattening them again. """
+        output = self.run_pig("""
+            users = LOAD '$dir/users.txt' AS (name, age:int, city);
+            young = FILTER users BY age < 40;
+            ages = FOREACH young GENERATE age, name;
+            by_age = GROUP ages BY age;
+            flat = FOREACH by_age GENERATE FLATTEN(ages);
+            DUMP by_age;
+            DUMP flat;
+        """)
+        self.assertEqual([
+            '(25,{(25,bob)})',
+            '(30,{(30,alice),(30,erin)})',
+            '(25,bob)',
+            '(30,alice)',
+            '(30,erin)',
+        ], output)
+
+    def test_join_order_limit(self):
+        """ Tests joining, ordering and limiting. """
+        output = self.run_pig("""
+            users = LOAD '$dir/users.txt' AS (name:chararray, age:int,
+                                              city:chararray);
+            cities = LOAD '$dir/cities.txt' USING PigStorage(',')
+                AS (code:chararray, city:chararray);
+            joined = JOIN users BY city, cities BY code;
+            out = FOREACH joined GENERATE name, cities::city;
+            sorted = ORDER out BY name DESC;
+            top = LIMIT sorted 3;
+            DUMP top;
+        """)
+        self.assertEqual([
+            '(dave,San Francisco)',
+            '(carol,New York)',
+            '(bob,San Francisco)',
+        ], output)
+
+    def test_distinct_store(self):
+        """ Tests DISTINCT and writing PigStorage output. """
+        self.run_pig("""
+            users = LOAD '$dir/users.txt';
+            cities = FOREACH users GENERATE $2;
+            unique = DISTINCT cities;
+            STORE unique INTO '$dir/out' USING PigStorage(',');
+        """)
+        self.assertEqual(
+            ['_SUCCESS', 'part-r-00000'],
+            sorted(os.listdir(self.path('out')))
+        )
+        with open(self.path('out/part-r-00000')) as f:
+            self.assertEqual('la\nnyc\nsf\n', f.read())
+
+    def test_unsupported(self):
+        """ Tests that scripts outside the subset are rejected. """
+        self.assertRaises(
+            UnsupportedScript,
+            parse,
+            "A = LOAD 'x'; B = COGROUP A BY $0, A BY $1;"
+        )
+        self.assertRaises(
+            UnsupportedScript,
+            parse,
+            "REGISTER 'udfs.jar';"
+        )
+
+    def test_ragged_rows(self):
+        """ Tests that rows of different widths without a schema need pig. """
+        self.write('ragged.txt', ['a\tb', 'c'])
+        self.write('script.pig', ["A = LOAD '$dir/ragged.txt'; DUMP A;"])
+        self.assertRaises(UnsupportedScript, run_script, PigTestOptions(
+            file=self.path('script.pig'),
+            params={'dir': self.dir}
+        ))
+
+    def test_fallback_to_pig(self):
+        """ Tests that unsupported scripts are run with pig instead. """
+        pigthon = Pigthon()
+        calls = []
+        pigthon.pig = lambda options: calls.append(options) or (0, [], [])
+        self.write('script.pig', ["A = LOAD 'x'; STREAM A THROUGH `cat`;"])
+        pigthon.test(PigTestOptions(
+            file=self.path('script.pig'),
+            backend='python'
+        ))
+        self.assertEqual(1, len(calls))
+
+    def test_without_numpy(self):
+        """ Tests that pigthon imports, and falls back, without numpy. """
+        script = '\n'.join([
+            'import sys',
+            'sys.modules["numpy"] = None',
+            'from pigthon.main import PigTestOptions',
+            'from pigthon.latin.parser import UnsupportedScript',
+            'from pigthon.latin.runner import run_script',
+            'try:',
+            '    run_script(PigTestOptions(execute="A = LOAD \'x\';"))',
+            'except UnsupportedScript:',
+            '    sys.exit(0)',
+            'sys.exit(1)',
+        ])
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        process = subprocess.Popen(
+            [sys.executable, '-c', script],
+            cwd=root,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE
+        )
+        output, error = process.communicate()
+        self.assertEqual(0, process.returncode, error)
+
+    def test_format_double(self):
+        """ Tests formatting doubles as java does. """
+        self.assertEqual('1.0', format_double(1.0))
+        self.assertEqual('0.001', format_double(0.001))
+        self.assertEqual('1.0E7', format_double(1e7))
+        self.assertEqual('1.5E-4', format_double(0.00015))
+        self.assertEqual('1.2345679E7', format_double(12345678.9, 'float'))
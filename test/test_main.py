@@ -4,6 +4,7 @@
 from os.path import abspath, normpath, dirname
 from test.test_base import TestBase
 from pigthon.main import Pigthon, PigOptions
+import os
 
 
 class Test(TestBase):
@@ -52,3 +53,69 @@ class Test(TestBase):
             ['-param', 'cake="IMPORT \'"\'"\'/path/to/import\'"\'"\';"'],
             po.to_cmd_array()
         )
+
+    def test_cmd_array_tez(self):
+        """ Tests running with the tez execution engine. """
+        po = PigOptions(exectype='tez_local')
+        self.assertEqual(['-exectype', 'tez_local'], po.to_cmd_array())
+
+    def test_cmd_array_spark(self):
+        """ Tests the properties the spark execution engine needs. """
+        po = PigOptions(exectype='spark_local')
+        self.assertEqual(
+            ['-Dspark.master=local', '-exectype', 'spark_local'],
+            po.to_cmd_array()
+        )
+
+    def test_cmd_array_spark_dparams_override(self):
+        """ Tests that dparams take precedence over engine properties. """
+        po = PigOptions(exectype='spark', dparams={'spark.master': 'local'})
+        self.assertEqual(
+            ['-Dspark.master=local', '-exectype', 'spark'],
+            po.to_cmd_array()
+        )
+
+    def test_cmd_array_spark_environment(self):
+        """ Tests that SPARK_MASTER in the environment is left in charge. """
+        previous = os.environ.get('SPARK_MASTER', None)
+        os.environ['SPARK_MASTER'] = 'spark://master:7077'
+        try:
+            po = PigOptions(exectype='spark')
+            self.assertEqual(['-exectype', 'spark'], po.to_cmd_array())
+            self.assertEqual({}, po.environment())
+        finally:
+            if previous is None:
+                del os.environ['SPARK_MASTER']
+            else:
+                os.environ['SPARK_MASTER'] = previous
+
+    def test_cmd_array_bad_exectype(self):
+        """ Tests that unknown execution engines are rejected. """
+        self.assertRaises(AssertionError, PigOptions, exectype='flink')
+
+    def test_explain_statement(self):
+        """ Tests the explain statement and engine explain runs with. """
+        pigthon = Pigthon()
+        calls = []
+        pigthon.pig = lambda options, record=True: \
+            calls.append((options, record)) or (0, [], [])
+        pigthon.explain(PigOptions(
+            file="my script's.pig",
+            params={'date': '2014-01-01 00:00'},
+            param_file='params.txt',
+            exectype='tez'
+        ))
+        options, record = calls[0]
+        self.assertEqual(
+            "explain -script 'my script\\'s.pig' "
+            "-param 'date=2014-01-01 00:00' -param_file 'params.txt'",
+            options.execute()
+        )
+        self.assertEqual(
+            ['-exectype', 'mapreduce', '-execute',
+             "explain -script 'my script\\'s.pig' "
+             "-param 'date=2014-01-01 00:00' -param_file 'params.txt'"],
+            options.to_cmd_array()
+        )
+        self.assertEqual(None, options.param_file())
+        self.assertFalse(record)
@@ -0,0 +1,130 @@
+""" Unit tests for sample. """
+
+
+from pigthon.main import PigTestOptions
+from pigthon.sample import Sampler
+from test.test_base import TestBase
+import os
+import shutil
+import tempfile
+
+
+class Test(TestBase):
+    """ Test cases for Sampler. """
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.cache = os.path.join(self.dir, 'cache')
+        self.input = os.path.join(self.dir, 'input.txt')
+        self.write(self.input, 100)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, path, count):
+        """ Writes count numbered lines to path. """
+        with open(path, 'w') as f:
+            for i in range(count):
+                f.write('{}\tvalue{}\n'.format(i, i))
+
+    def read(self, path):
+        """ Reads the lines of path. """
+        with open(path, 'r') as f:
+            return f.read().splitlines()
+
+    def test_sample_rows(self):
+        """ Tests reservoir sampling a fixed number of rows. """
+        sampler = Sampler(rows=10, cache_dir=self.cache)
+        lines = self.read(sampler.sample(self.input))
+        self.assertEqual(10, len(lines))
+        self.assertEqual(lines, sorted(lines, key=lambda l: int(l.split()[0])))
+        self.assertEqual(10, len(set(lines)))
+
+    def test_sample_fraction(self):
+        """ Tests sampling a fraction of rows. """
+        sampler = Sampler(fraction=0.5, cache_dir=self.cache)
+        lines = self.read(sampler.sample(self.input))
+        self.assertTrue(20 < len(lines) < 80)
+
+    def test_sample_deterministic(self):
+        """ Tests that the same seed picks the same rows. """
+        first = Sampler(rows=10, cache_dir=self.cache + '1')
+        second = Sampler(rows=10, cache_dir=self.cache + '2')
+        self.assertEqual(
+            self.read(first.sample(self.input)),
+            self.read(second.sample(self.input))
+        )
+
+    def test_sample_reused_until_changed(self):
+        """ Tests that samples are rebuilt only when the input changes. """
+        sampler = Sampler(rows=10, cache_dir=self.cache)
+        path = sampler.sample(self.input)
+        self.assertEqual(path, sampler.sample(self.input))
+        self.write(self.input, 5)
+        changed = sampler.sample(self.input)
+        self.assertNotEqual(path, changed)
+        self.assertEqual(5, len(self.read(changed)))
+
+    def test_sample_directory(self):
+        """ Tests sampling every visible file in a directory. """
+        directory = os.path.join(self.dir, 'parts')
+        os.mkdir(directory)
+        self.write(os.path.join(directory, 'part-00000'), 3)
+        self.write(os.path.join(directory, 'part-00001'), 3)
+        self.write(os.path.join(directory, '_SUCCESS'), 0)
+        sampler = Sampler(fraction=1, cache_dir=self.cache)
+        sample = sampler.sample(directory)
+        self.assertTrue(os.path.isdir(sample))
+        self.assertEqual(
+            6,
+            len(self.read(os.path.join(sample, os.listdir(sample)[0])))
+        )
+
+    def test_apply(self):
+        """ Tests pointing a script's LOAD statements at samples. """
+        script = os.path.join(self.dir, 'script.pig')
+        with open(script, 'w') as f:
+            f.write(
+                "A = LOAD '$input' USING PigStorage();\n"
+                "B = load 'hdfs:///remote/path';\n"
+                "STORE A INTO 'output';\n"
+            )
+        sampler = Sampler(rows=10, cache_dir=self.cache)
+        options = PigTestOptions(
+            file=script,
+            params={'input': self.input},
+            sample=sampler
+        )
+        sampled = sampler.apply(options)
+        self.assertEqual(script, options.file())
+        lines = self.read(sampled.file())
+        self.assertEqual(
+            "A = LOAD '{}' USING PigStorage();".format(
+                sampler.sample(self.input)),
+            lines[0]
+        )
+        self.assertEqual("B = load 'hdfs:///remote/path';", lines[1])
+        self.assertEqual("STORE A INTO 'output';", lines[2])
+
+    def test_rewrite_directives(self):
+        """ Tests resolving LOAD paths set by %default and %declare. """
+        other = os.path.join(self.dir, 'other.txt')
+        self.write(other, 50)
+        sampler = Sampler(rows=10, cache_dir=self.cache)
+        script = (
+            "%default input '{}'\n"
+            "%declare other '{}'\n"
+            "A = LOAD '$input';\n"
+            "B = LOAD '$other';\n"
+            "C = LOAD '$missing';\n"
+        ).format(self.input, other)
+        lines = sampler.rewrite(script).splitlines()
+        self.assertEqual(
+            "A = LOAD '{}';".format(sampler.sample(self.input)), lines[2])
+        self.assertEqual(
+            "B = LOAD '{}';".format(sampler.sample(other)), lines[3])
+        self.assertEqual("C = LOAD '$missing';", lines[4])
+
+        lines = sampler.rewrite(script, {'input': other}).splitlines()
+        self.assertEqual(
+            "A = LOAD '{}';".format(sampler.sample(other)), lines[2])
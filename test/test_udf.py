@@ -0,0 +1,124 @@
+""" Unit tests for udf. """
+
+
+from pigthon.main import PigOptions
+from pigthon.udf import FakeStreamDriver, UdfHost, decode, encode
+from test.test_base import TestBase
+import os
+import shutil
+import tempfile
+
+
+host = UdfHost(batch_size=2, ship=False)
+
+
+@host.register(input='a:int, b:int', output='total:long')
+def add(a, b):
+    """ Adds two columns, passing nulls through. """
+    return [None if x is None or y is None else x + y for x, y in zip(a, b)]
+
+
+@host.register(input='x:double', output='x:double, scaled:double',
+               arrays=True)
+def scale(x):
+    """ Returns a column unchanged alongside it doubled. """
+    return x, x * 2
+
+
+@host.register(input='x:int', output='value:int')
+def drop(x):
+    """ Wrongly returns one fewer row than it was passed. """
+    return x[1:]
+
+
+@host.register(name='shout', input='word:chararray', output='word',
+               vectorized=False)
+def upper(word):
+    """ Upper cases a single record. """
+    return word.upper()
+
+
+class Test(TestBase):
+    """ Test cases for UdfHost. """
+
+    def test_vectorized(self):
+        """ Tests calling a function with a column per field. """
+        driver = FakeStreamDriver(host)
+        self.assertEqual(
+            [(3,), (None,), (30,)],
+            driver.run('add', [(1, 2), (None, 5), (10, 20)])
+        )
+
+    def test_arrays(self):
+        """ Tests passing numeric columns as numpy arrays. """
+        driver = FakeStreamDriver(host)
+        self.assertEqual(
+            [(1.5, 3.0), (None, None), (-2.0, -4.0)],
+            driver.run('scale', [(1.5,), (None,), (-2.0,)])
+        )
+
+    def test_per_record(self):
+        """ Tests calling a function once per record. """
+        driver = FakeStreamDriver(host)
+        self.assertEqual(
+            [('A',), ('BC',)],
+            driver.run('shout', [('a',), ('bc',)], batch_size=10)
+        )
+
+    def test_encode_decode(self):
+        """ Tests the PigStreaming record format. """
+        self.assertEqual('1\t\tx\ttrue\n', encode((1, None, 'x', True)))
+        self.assertEqual(
+            (1, None, 'x'),
+            decode(
+                '1\t\tx\n',
+                [('a', 'int'), ('b', 'int'), ('c', 'chararray')]
+            )
+        )
+        self.assertEqual(('1', None, 'x'), decode('1\t\tx\n'))
+
+    def test_wrong_length(self):
+        """ Tests that output that doesn't match the batch is rejected. """
+        driver = FakeStreamDriver(host)
+        self.assertRaises(
+            ValueError, driver.run, 'drop', [(1,), (2,), (3,)])
+
+    def test_define_stream(self):
+        """ Tests generating the pig glue for a function. """
+        script = os.path.abspath(__file__).replace('.pyc', '.py')
+        self.assertEqual(
+            'DEFINE add `python {} add 2`;'.format(script),
+            host.define('add')
+        )
+        self.assertEqual(
+            'STREAM A THROUGH scale AS (x:double, scaled:double)',
+            host.stream('A', 'scale')
+        )
+
+    def test_define_ship(self):
+        """ Tests shipping the module defining a function. """
+        shipped = UdfHost()
+        shipped.register(output='total:long')(add)
+        script = os.path.abspath(__file__).replace('.pyc', '.py')
+        self.assertEqual(
+            "DEFINE add `python test_udf.py add 4096` SHIP('{}');".format(
+                script),
+            shipped.define('add')
+        )
+
+    def test_apply(self):
+        """ Tests adding the DEFINE statements to a script. """
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'script.pig')
+            with open(path, 'w') as f:
+                f.write("A = LOAD 'x';\n")
+            scripted = UdfHost(ship=False, script_dir=directory)
+            scripted.register(output='total:long')(add)
+            options = scripted.apply(PigOptions(file=path))
+            with open(options.file(), 'r') as f:
+                lines = f.read().splitlines()
+            self.assertEqual(scripted.define('add'), lines[0])
+            self.assertEqual("A = LOAD 'x';", lines[1])
+        finally:
+            shutil.rmtree(directory)